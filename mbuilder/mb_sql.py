@@ -1,3 +1,5 @@
+from datetime import datetime, timezone
+
 from dateutil.parser import parse
 
 
@@ -34,18 +36,60 @@ def generate_slurm_state_sql(start: str, end: str, interval: str):
     return sql
 
 
+# Widths of the buckets of the continuous aggregates, coarsest first
+AGGREGATE_SECONDS = {'1h': 3600, '5m': 300, '1m': 60}
+
+# Aggregation of the bucketed min, max, sum and count of an aggregate
+AGGREGATE_VALUE = {
+    'min': 'min(min)',
+    'max': 'max(max)',
+    'sum': 'sum(sum)',
+    'avg': 'sum(sum)::double precision / sum(count)',
+}
+
+
+def interval_seconds(interval: str):
+    # Seconds of an interval such as '5m'
+    return int(interval[:-1]) * {'s': 1, 'm': 60, 'h': 3600}[interval[-1]]
+
+
+def route_metric_source(table: str, start: str, end: str, interval: str,
+                        aggregation: str, aggregates: set):
+    """
+    Source, value expression and time range of a metric query: the coarsest
+    continuous aggregate of the table whose buckets tile the interval, or the
+    raw table. An aggregate only has whole buckets, so the range is widened
+    to them (start floored, end ceiled). As the buckets tile the interval,
+    the intervals returned are the same as from the raw table, but the first
+    and last ones are complete instead of cut at the ends of the range.
+    """
+    seconds = interval_seconds(interval)
+    for bucket, width in AGGREGATE_SECONDS.items():
+        view = f"{table}_agg_{bucket}"
+        if view in aggregates and seconds % width == 0:
+            start_epoch = parse(start).timestamp() // width * width
+            end_epoch = -(-parse(end).timestamp() // width) * width
+            return (view, AGGREGATE_VALUE[aggregation],
+                    datetime.fromtimestamp(start_epoch, timezone.utc).isoformat(),
+                    datetime.fromtimestamp(end_epoch, timezone.utc).isoformat())
+    return table, f"{aggregation}(value)", start, end
+
+
 def generate_idrac_metric_sql(table: str,
                               start: str,
                               end: str,
                               interval: str,
-                              aggregation: str):
+                              aggregation: str,
+                              aggregates: set = ()):
+    source, value, start, end = route_metric_source(f"idrac.{table}", start, end,
+                                                    interval, aggregation, aggregates)
     sql = f"SELECT time_bucket_gapfill('{interval}', timestamp) AS time, \
-        nodes.hostname as node, fqdd.fqdd AS label, {aggregation}(value) AS value \
-        FROM idrac.{table} \
+        nodes.hostname as node, fqdd.fqdd AS label, {value} AS value \
+        FROM {source} AS metric \
         JOIN nodes \
-        ON idrac.{table}.nodeid = nodes.nodeid \
+        ON metric.nodeid = nodes.nodeid \
         JOIN fqdd \
-        ON idrac.{table}.fqdd = fqdd.id \
+        ON metric.fqdd = fqdd.id \
         WHERE timestamp >= '{start}' \
         AND timestamp < '{end}' \
         GROUP BY time, node, label \
@@ -57,12 +101,15 @@ def generate_slurm_metric_sql(table: str,
                               start: str,
                               end: str,
                               interval: str,
-                              aggregation: str):
+                              aggregation: str,
+                              aggregates: set = ()):
+    source, value, start, end = route_metric_source(f"slurm.{table}", start, end,
+                                                    interval, aggregation, aggregates)
     sql = f"SELECT time_bucket_gapfill('{interval}', timestamp) AS time, \
-            nodes.hostname as node, {aggregation}(value) AS value \
-            FROM slurm.{table} \
+            nodes.hostname as node, {value} AS value \
+            FROM {source} AS metric \
             JOIN nodes \
-            ON slurm.{table}.nodeid = nodes.nodeid \
+            ON metric.nodeid = nodes.nodeid \
             WHERE timestamp >= '{start}' \
             AND timestamp < '{end}' \
             GROUP BY time, node \
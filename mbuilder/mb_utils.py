@@ -142,8 +142,22 @@ def query_db(connection: str, sql: str, nodelist: list):
     return record
 
 
+def get_aggregates(connection: str):
+    # Names of the continuous aggregates, e.g. {'idrac.rpmreading_agg_5m'}
+    engine = db.create_engine(connection)
+    sql = "SELECT view_schema || '.' || view_name AS name \
+           FROM timescaledb_information.continuous_aggregates;"
+    try:
+        dataframe = pd.read_sql_query(sql, engine)
+    except Exception:
+        # TimescaleDB without continuous aggregates, query the raw tables
+        return set()
+    return set(dataframe['name'])
+
+
 def query_db_wrapper(connection: str, start: str, end: str, interval: str,
-                     aggregation: str, nodelist: list, table: str):
+                     aggregation: str, nodelist: list, table: str,
+                     aggregates: set = ()):
     metric = []
     if table == 'slurm.jobs':
         sql = mb_sql.generate_slurm_jobs_sql(start, end)
@@ -157,12 +171,12 @@ def query_db_wrapper(connection: str, start: str, end: str, interval: str,
     elif 'slurm' in table:
         slurm_metric = table.split('.')[1]
         sql = mb_sql.generate_slurm_metric_sql(slurm_metric, start, end,
-                                               interval, aggregation)
+                                               interval, aggregation, aggregates)
         metric = query_db(connection, sql, nodelist)
     elif 'idrac' in table:
         idrac_metric = table.split('.')[1]
         sql = mb_sql.generate_idrac_metric_sql(idrac_metric, start, end,
-                                               interval, aggregation)
+                                               interval, aggregation, aggregates)
         metric = query_db(connection, sql, nodelist)
     else:
         pass
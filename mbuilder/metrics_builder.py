@@ -43,6 +43,9 @@ def metrics_builder(config,
     else:
         return {}
 
+    # Continuous aggregates the queries can read instead of the raw tables
+    aggregates = mb_utils.get_aggregates(connection)
+
     # Parallelize the queries
     with multiprocessing.Pool(len(tables)) as pool:
         query_db_args = zip(repeat(connection),
@@ -51,7 +54,8 @@ def metrics_builder(config,
                             repeat(interval),
                             repeat(aggregation),
                             repeat(nodelist),
-                            tables)
+                            tables,
+                            repeat(aggregates))
         records = pool.starmap(mb_utils.query_db_wrapper, query_db_args)
 
     # Combine the results
@@ -0,0 +1,82 @@
+import time
+
+import exporter
+import logger
+
+log = logger.get_logger(__name__)
+
+
+class Circuit:
+    """
+    Circuit breaker of one host. After `threshold` consecutive failed
+    requests the circuit opens and requests to the host fail fast. Once
+    `backoff` seconds have passed, a single probe request goes through: if it
+    succeeds the circuit closes, otherwise it opens again for twice as long,
+    up to `max_backoff` seconds.
+    """
+    def __init__(self, host: str, threshold: int, backoff: float, max_backoff: float):
+        self.host        = host
+        self.threshold   = threshold
+        self.min_backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.failures = 0
+        self.backoff  = backoff
+        self.opened   = None
+        self.retry_at = 0.0
+        self.probing  = False
+
+    def allow(self):
+        if self.opened is None:
+            return True
+        if self.probing or time.monotonic() < self.retry_at:
+            return False
+        self.probing = True
+        return True
+
+    def success(self):
+        if self.opened is not None:
+            log.info(f"Circuit of {self.host} closed after {time.monotonic() - self.opened:.0f} s")
+        self.failures = 0
+        self.backoff  = self.min_backoff
+        self.opened   = None
+        self.probing  = False
+
+    def failure(self):
+        self.failures += 1
+        if self.probing:
+            # The probe failed, wait longer before the next one
+            self.probing  = False
+            self.backoff  = min(self.max_backoff, self.backoff * 2)
+            self.retry_at = time.monotonic() + self.backoff
+        elif self.opened is None and self.failures >= self.threshold:
+            self.opened   = time.monotonic()
+            self.retry_at = self.opened + self.backoff
+            log.warning(f"Circuit of {self.host} opened after {self.failures} failed requests, "
+                        f"probing every {self.backoff:.0f} s or more")
+
+    def release(self):
+        # The probe was cancelled without an answer
+        self.probing = False
+
+
+# Circuits of all hosts polled by this process
+circuits = {}
+settings = {'threshold': 3, 'backoff': 60.0, 'max_backoff': 900.0}
+
+
+def configure(threshold: int, backoff: float, max_backoff: float):
+    settings.update(threshold=threshold, backoff=backoff, max_backoff=max_backoff)
+
+
+def get_circuit(host: str):
+    if host not in circuits:
+        circuits[host] = Circuit(host, settings['threshold'], settings['backoff'], settings['max_backoff'])
+    return circuits[host]
+
+
+def open_circuits():
+    return [host for host, circuit in circuits.items() if circuit.opened is not None]
+
+
+exporter.OPEN_CIRCUITS.track(lambda: {(host,): 1 for host in open_circuits()})
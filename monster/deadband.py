@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+import exporter
+import logger
+
+log = logger.get_logger(__name__)
+
+
+class Deadband:
+    """
+    Drop the samples of a series (node, source, fqdd) that stay within the
+    deadband of its metric from the last written value, e.g. fan speeds that
+    move by a few RPM. Non-numeric values, and numeric ones with a deadband of
+    0, are written only when they change. A sample is written anyway once
+    `heartbeat` seconds have passed since the last written one, so a series
+    never goes silent for longer; queries carry the last value forward.
+    Metrics without a deadband, and without a `default`, are not filtered.
+    """
+    def __init__(self, metrics: dict, default: float = None, heartbeat: float = 600):
+        # Deadbands by table, e.g. {'idrac.rpmreading': 100}
+        self.bands     = {f"idrac.{metric.lower()}": band for metric, band in metrics.items()}
+        self.default   = default
+        self.heartbeat = timedelta(seconds=heartbeat)
+        # Last written (timestamp, value) of each series, by table
+        self.last      = {}
+
+    def select(self, table_name: str, records: list):
+        # Records are (timestamp, nodeid, source, fqdd, value) tuples. Returns
+        # the records to write and the series state they leave, which is
+        # saved by commit once they are written.
+        band = self.bands.get(table_name, self.default)
+        if band is None:
+            return records, {}
+        last      = self.last.get(table_name, {})
+        heartbeat = self.heartbeat
+        kept      = []
+        pending   = {}
+        for record in records:
+            timestamp, nodeid, source, fqdd, value = record
+            key = (nodeid, source, fqdd)
+            previous = pending.get(key) or last.get(key)
+            if previous is not None and timestamp - previous[0] < heartbeat:
+                written = previous[1]
+                if value == written:
+                    continue
+                if band and isinstance(value, (int, float)) and isinstance(written, (int, float)) \
+                   and abs(value - written) <= band:
+                    continue
+            pending[key] = (timestamp, value)
+            kept.append(record)
+        if len(kept) < len(records):
+            exporter.SUPPRESSED.inc((table_name,), len(records) - len(kept))
+        return kept, pending
+
+    def commit(self, table_name: str, pending: dict):
+        if pending:
+            self.last.setdefault(table_name, {}).update(pending)
+
+    def filter(self, table_name: str, records: list):
+        # Select and commit at once, for records whose write is retried or
+        # spooled on failure rather than lost
+        kept, pending = self.select(table_name, records)
+        self.commit(table_name, pending)
+        return kept
+
+def from_config(deadband_config: dict):
+    # None if no metric is filtered
+    if not deadband_config or (not deadband_config['metrics'] and deadband_config['default'] is None):
+        return None
+    return Deadband(deadband_config['metrics'], deadband_config['default'], deadband_config['heartbeat'])
@@ -0,0 +1,189 @@
+import time
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import logger
+
+log = logger.get_logger(__name__)
+
+
+class Metric:
+    """
+    A metric of the collector with one value per combination of label values.
+    Labels are passed as a tuple in the order of `labels`.
+    """
+    kind = 'untyped'
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name   = name
+        self.help   = help
+        self.labels = labels
+        self.values = {}
+        self.lock   = threading.Lock()
+        REGISTRY.append(self)
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, self.labels, labels, value) for labels, value in self.values.items()]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, labels: tuple = (), value: float = 1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + value
+
+
+class Gauge(Metric):
+    """
+    A gauge is either set on updates, or computed by `collect` when scraped,
+    which costs nothing on the hot path. `collect` returns {labels: value}.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        super().__init__(name, help, labels)
+        self.collect = None
+
+    def set(self, labels: tuple = (), value: float = 0):
+        with self.lock:
+            self.values[labels] = value
+
+    def track(self, collect: object):
+        # Replaces the previous function, e.g. of a restarted event loop
+        self.collect = collect
+
+    def samples(self):
+        samples = super().samples()
+        if self.collect:
+            try:
+                samples.extend((self.name, self.labels, labels, value)
+                               for labels, value in self.collect().items())
+            except Exception as err:
+                log.error(f"Cannot collect {self.name}: {err}")
+        return samples
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = ()):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, labels: tuple = ()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            if labels not in self.values:
+                # Count per bucket, the last one is +Inf, then sum and count
+                self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            counts = self.values[labels]
+            counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def samples(self):
+        samples = []
+        bucket_labels = self.labels + ('le',)
+        with self.lock:
+            for labels, counts in self.values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += count
+                    samples.append((f"{self.name}_bucket", bucket_labels, labels + (bound,), cumulative))
+                samples.append((f"{self.name}_sum", self.labels, labels, counts[-2]))
+                samples.append((f"{self.name}_count", self.labels, labels, counts[-1]))
+        return samples
+
+
+REGISTRY = []
+
+RECORDS       = Counter('monster_records_total', 'Records written to the database', ('table',))
+FLUSHES       = Counter('monster_flushes_total', 'Batches written to the database', ('status',))
+COPY_SECONDS  = Histogram('monster_copy_seconds', 'Latency of writing a batch to the database',
+                          buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+SPOOLED       = Counter('monster_spooled_records_total', 'Records spooled to disk')
+SUPPRESSED    = Counter('monster_suppressed_records_total', 'Records dropped within their deadband', ('table',))
+FETCH_SECONDS = Histogram('monster_fetch_seconds', 'Latency of requests to the BMCs and PDUs', ('host',),
+                          buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0))
+FETCH_LIMIT   = Gauge('monster_fetch_concurrency_limit', 'Current limit of concurrent requests')
+FETCH_ERRORS  = Counter('monster_fetch_errors_total', 'Failed requests to BMCs, PDUs, IRCs and Slurm', ('host',))
+REPORTS       = Counter('monster_reports_total', 'Metric reports received from iDRAC streams')
+QUEUE_DEPTH   = Gauge('monster_queue_depth', 'Items waiting in the push-mode queues', ('queue',))
+EVENT_AGE     = Gauge('monster_last_event_age_seconds', 'Seconds since the last event of a stream', ('node',))
+STREAMS       = Gauge('monster_streams_connected', 'Connected iDRAC streams')
+RECONNECTS    = Gauge('monster_stream_reconnects', 'Reconnects of the iDRAC streams since start')
+CYCLE_SECONDS = Histogram('monster_cycle_seconds', 'Duration of the polling cycles', ('collector',),
+                          buckets=(1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 45.0, 60.0, 90.0, 120.0, 300.0))
+CYCLE_LAG     = Gauge('monster_cycle_lag_seconds', 'Delay between the tick and the start of the last cycle',
+                      ('collector',))
+OVERRUNS      = Counter('monster_cycle_overruns_total', 'Cycles that took longer than their interval', ('collector',))
+SKIPPED_TICKS = Counter('monster_skipped_ticks_total', 'Ticks skipped because the previous cycle was running',
+                        ('collector',))
+SHED_REQUESTS = Counter('monster_shed_requests_total', 'Requests cancelled at the cycle deadline')
+OPEN_CIRCUITS = Gauge('monster_circuit_open', 'Hosts whose circuit breaker is open', ('host',))
+START_TIME    = Gauge('monster_start_time_seconds', 'Start time of the process since the epoch')
+
+
+def format_labels(names: tuple, labels: tuple):
+    if not labels:
+        return ''
+    pairs = []
+    for name, value in zip(names, labels):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def render():
+    # Prometheus text exposition format
+    lines = []
+    for metric in REGISTRY:
+        samples = metric.samples()
+        if not samples:
+            continue
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, names, labels, value in samples:
+            lines.append(f"{name}{format_labels(names, labels)} {value}")
+    lines.append('')
+    return '\n'.join(lines).encode('utf-8')
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = render()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are not worth a log line
+        pass
+
+
+def start(exporter_config: dict, offset: int = 0):
+    """
+    Serve the metrics of this process on `port + offset`, so each process of
+    a collector gets its own port. Does nothing if the exporter is disabled.
+    """
+    if not exporter_config:
+        return None
+    port = exporter_config['port'] + offset
+    try:
+        server = ThreadingHTTPServer((exporter_config['host'], port), Handler)
+    except OSError as err:
+        log.error(f"Cannot serve metrics on port {port}: {err}")
+        return None
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='exporter', daemon=True)
+    thread.start()
+    START_TIME.set((), time.time())
+    return server
@@ -0,0 +1,119 @@
+from array import array
+
+import logger
+
+log = logger.get_logger(__name__)
+
+# How each pull-mode metric is read from the Redfish resources, by default:
+# `resource` is the last segment of the API URL holding the metric, `items`
+# the path of its array in the resource (the metric name if not given), and
+# `fqdd`, `source` and `value` the paths of the fields of each item. Paths are
+# '/'-separated for nested properties. `type` is a Redfish MetricDataType.
+DEFAULT_SPECS = {
+    'Fans': {'resource': 'Thermal', 'fqdd': 'FanName', 'source': '@odata.type',
+             'value': 'Reading', 'type': 'Integer', 'units': 'RPM'},
+    'Temperatures': {'resource': 'Thermal', 'fqdd': 'Name', 'source': '@odata.type',
+                     'value': 'ReadingCelsius', 'type': 'Integer', 'units': 'Cel'},
+    'PowerControl': {'resource': 'Power', 'fqdd': 'Name', 'source': '@odata.type',
+                     'value': 'PowerConsumedWatts', 'type': 'Integer', 'units': 'Watts'},
+}
+
+# Conversion and array typecode of the values of each MetricDataType; values
+# of other types are kept in lists as they are
+VALUE_TYPES = {'Integer': (int, 'q'), 'Decimal': (float, 'd')}
+
+
+def compile_path(path: str, default: object):
+    # Accessor of the property at `path` of a dict, or `default` if missing
+    keys = path.split('/')
+    if len(keys) == 1:
+        key = keys[0]
+        return lambda item: item.get(key, default)
+
+    def get(item):
+        for key in keys:
+            if not isinstance(item, dict) or key not in item:
+                return default
+            item = item[key]
+        return item
+    return get
+
+
+def path_expression(path: str, default: str):
+    # Python expression of the property at `path` of `item`
+    keys = path.split('/')
+    expression = 'item'
+    for key in keys[:-1]:
+        expression = f"({expression}.get({key!r}) or {{}})"
+    return f"{expression}.get({keys[-1]!r}, {default})"
+
+
+def compile_extractor(spec: dict, convert: object):
+    """
+    Generate the function that appends the source ids, fqdd ids and values of
+    the items of a metric to its columns, with the paths of the spec inlined,
+    so nothing about the spec is looked up per item.
+    """
+    value = path_expression(spec['value'], '0')
+    code = (
+        "def extract(items, sources, fqdds, values, source_map, fqdd_map):\n"
+        f"    sources += [source_map[{path_expression(spec['source'], repr('None'))}] for item in items]\n"
+        f"    fqdds += [fqdd_map[{path_expression(spec['fqdd'], repr('None'))}.replace(' ', '_')] for item in items]\n"
+        f"    values += [{f'convert({value})' if convert else value} for item in items]\n"
+    )
+    namespace = {'convert': convert}
+    exec(code, namespace)
+    return namespace['extract']
+
+
+class ExtractionPlan:
+    """
+    Extraction of one metric compiled from its spec into a generated loop
+    over the items of a report. The columns are lists while a batch of
+    reports is parsed, and typed arrays of the column types of the metric
+    table once it is done.
+    """
+    def __init__(self, metric: str, spec: dict):
+        missing = [field for field in ('resource', 'fqdd', 'source', 'value') if not spec.get(field)]
+        if missing:
+            raise ValueError(f"No {', '.join(missing)} in the extraction spec of {metric}")
+        self.metric     = metric
+        self.spec       = spec
+        self.table_name = f"idrac.{metric.lower()}"
+        self.resource   = spec['resource']
+        self.data_type  = spec.get('type', 'Integer')
+        self.units      = spec.get('units', None)
+
+        self.convert, self.typecode = VALUE_TYPES.get(self.data_type, (None, None))
+        self.items   = compile_path(spec.get('items', metric), None)
+        self.fqdd    = compile_path(spec['fqdd'], "None")
+        self.source  = compile_path(spec['source'], "None")
+        self.extract = compile_extractor(spec, self.convert)
+
+    def typed(self, columns: tuple):
+        # (nodeid, source, fqdd, value) columns as arrays
+        nodeids, sources, fqdds, values = columns
+        if self.typecode:
+            values = array(self.typecode, values)
+        return (array('q', nodeids), array('q', sources), array('q', fqdds), values)
+
+    def names(self, report: dict):
+        # (fqdd, source) of each item of the report
+        for item in self.items(report) or ():
+            yield (self.fqdd(item).replace(" ", "_"), self.source(item))
+
+
+def compile_plans(idrac_metrics: list, specs: dict = None):
+    # Plans of the metrics, from the default specs overridden by `specs`
+    specs = specs or {}
+    plans = []
+    for metric in idrac_metrics:
+        spec = dict(DEFAULT_SPECS.get(metric, {}))
+        spec.update(specs.get(metric) or {})
+        plans.append(ExtractionPlan(metric, spec))
+    return plans
+
+
+def plan_specs(plans: list):
+    # What worker processes need to compile the same plans
+    return [(plan.metric, plan.spec) for plan in plans]
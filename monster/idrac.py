@@ -1,12 +1,29 @@
+import time
 import asyncio
-import psycopg2
 import random
 
+import psycopg2
+
+import breaker
+import deadband
+import exporter
 import logger
 import process
+import scheduling
+import writer
+from interner import Interner
+from limiter import AdaptiveLimiter
+from monster import utils
+from ringbuffer import RingBuffer
+from supervisor import Supervisor
 
 log = logger.get_logger(__name__)
 
+# Seconds a $select probe of a service root may take, and cycles before a
+# node whose probe failed is probed again
+PROBE_TIMEOUT = 10
+PROBE_RETRY   = 10
+
 
 def get_nodes_metadata(nodelist: list, valid_nodelist: list, username: str, password: str):
     system_base_url = "/redfish/v1/Systems/System.Embedded.1"
@@ -32,13 +49,13 @@ def get_nodes_metadata(nodelist: list, valid_nodelist: list, username: str, pass
     return metadata
 
 
-def get_fqdd_source_pull(nodelist: list, api: list, metrics: list,
+def get_fqdd_source_pull(nodelist: list, api: list, plans: list,
                         username: str, password: str):
     for node in nodelist:
         urls = [f"https://{node}{url}" for url in api]
         redfish_report = process.run_fetch_all(urls, username, password)
         if redfish_report:
-            return process.extract_fqdd_source_pull(redfish_report, metrics)
+            return process.extract_fqdd_source_pull(redfish_report, plans)
 
 
 def get_fqdd_source_push(nodelist: list, username: str, password: str):
@@ -49,13 +66,12 @@ def get_fqdd_source_push(nodelist: list, username: str, password: str):
             return process.extract_fqdd_source_push(telemetry_service)
 
 
-def get_metric_definitions_pull(idrac_metrics: list):
+def get_metric_definitions_pull(plans: list):
     metric_definitions = []
-    unit_map = {'Fans': 'RPM', 'Temperatures': 'Cel', 'PowerControl': 'Watts'}
-    for metric in idrac_metrics:
-        metric_definitions.append({'Id': metric,
-                                   'MetricDataType': 'Integer',
-                                   'Units': unit_map.get(metric, None)})
+    for plan in plans:
+        metric_definitions.append({'Id': plan.metric,
+                                   'MetricDataType': plan.data_type,
+                                   'Units': plan.units})
     return metric_definitions
 
 
@@ -99,42 +115,248 @@ def get_metric_definition_urls_push(node: str, idrac_metrics: list, username: st
     return selected_metrics_urls
 
 
-def get_idrac_metrics_pull(api: list, timestamp, idrac_metrics: list,
-                          nodelist: list, username: str, password: str,
-                          nodeid_map: dict, source_map: dict, fqdd_map: dict):
-    urls = [f"https://{node}{url}" for url in api for node in nodelist]
-    redfish_report = process.run_fetch_all(urls, username, password)
-    if redfish_report:
-        processed_records = process.process_all_idracs_pull(api, timestamp, idrac_metrics,
-                                                           nodelist, redfish_report,
-                                                           nodeid_map, source_map, fqdd_map)
-        return processed_records
+class IdracPullDaemon:
+    """
+    Pull-mode daemon: poll the iDRACs every `interval` seconds with one event
+    loop, one keep-alive HTTP session and one database connection for its
+    whole life. Each node is polled at its own fixed phase within the first
+    `spread` of the interval, and its readings are stamped with the start of
+    the interval. Requests still pending `deadline` of the interval after the
+    tick are shed; a tick that comes while the previous cycle is still running
+    is skipped. The node ids are reloaded only when a node has no id yet; new
+    sources and fqdds are registered by the interners. The request
+    concurrency adapts across cycles. Nodes whose Redfish service supports
+    $select are asked for the metric properties only. Readings within their
+    deadband are not written.
+    """
+    cols = ('timestamp', 'nodeid', 'source', 'fqdd', 'value')
+
+    def __init__(self, api: list, plans: list, nodelist: list, username: str,
+                 password: str, connection: str, fetch_config: dict, interval: float = 60,
+                 spread: float = 0.5, deadline: float = 0.9, deadband_config: dict = None):
+        self.api           = api
+        self.plans         = plans
+        self.nodelist      = nodelist
+        self.username      = username
+        self.password      = password
+        self.connection    = connection
+        self.fetch_config  = fetch_config
+        self.interval      = interval
+        self.deadline      = deadline
+        self.band          = deadband.from_config(deadband_config)
+
+        self.offsets     = {node: scheduling.phase_offset(node, interval, spread) for node in nodelist}
+        self.conn        = None
+        self.managers    = {}
+        self.nodeid_map  = {}
+        self.fqdd_map    = None
+        self.source_map  = None
+        self.last_reload = None
+        # Per node: 'select', 'trial' (polled without $select after a $select
+        # request was rejected) or 'plain'; nodes not yet probed are polled plain
+        self.select      = {}
+        # Monotonic time after which a node whose probe failed is probed again
+        self.probe_after = {}
+
+    async def run(self):
+        self.session = process.new_pull_session(self.username, self.password, keepalive=2 * self.interval)
+        self.limiter = AdaptiveLimiter(self.fetch_config['initial'], self.fetch_config['minimum'],
+                                       self.fetch_config['maximum'], self.fetch_config['per_host'],
+                                       self.fetch_config['latency_target'])
+        breaker.configure(self.fetch_config['failure_threshold'], self.fetch_config['probe_interval'],
+                          self.fetch_config['max_probe_interval'])
+        running = None
+        try:
+            while True:
+                tick = scheduling.next_tick(self.interval)
+                await asyncio.sleep(max(0.0, tick - time.time()))
+                if running is not None and not running.done():
+                    log.warning(f"Pull cycle overran its interval, skipping the tick of "
+                                f"{scheduling.bucket_timestamp(tick, self.interval)}")
+                    exporter.SKIPPED_TICKS.inc(('idrac',))
+                    continue
+                running = asyncio.create_task(self.cycle(tick))
+        finally:
+            if running is not None:
+                running.cancel()
+            await self.session.close()
+            if self.conn is not None:
+                self.conn.close()
+
+    async def cycle(self, tick: float):
+        started   = time.time()
+        deadline  = tick + self.deadline * self.interval
+        timestamp = scheduling.bucket_timestamp(tick, self.interval)
+        loop      = asyncio.get_running_loop()
+        try:
+            # Database work runs on a thread, off the event loop
+            await loop.run_in_executor(None, self.prepare)
+            urls   = [self.url(node, url) for url in self.api for node in self.nodelist]
+            # Phases count from the tick, not from the end of the preparation
+            now    = time.time()
+            delays = [max(0.0, tick + self.offsets[node] - now) for url in self.api for node in self.nodelist]
+            # Unprobed nodes are probed alongside the fetch, which polls them
+            # plain; their probed state applies from the next cycle
+            probed, redfish_report = await asyncio.gather(
+                self.discover(min(deadline, now + PROBE_TIMEOUT)),
+                process.fetch_all(urls, session=self.session, limiter=self.limiter,
+                                  delays=delays, deadline=deadline))
+            self.check_select(redfish_report)
+            self.select.update(probed)
+            await loop.run_in_executor(None, self.write, timestamp, redfish_report)
+        except Exception as err:
+            log.error(f"Cannot collect idrac metrics of {timestamp}: {err}")
+            if self.conn is not None and not self.conn.closed:
+                try:
+                    self.conn.rollback()
+                except Exception:
+                    self.conn.close()
+        scheduling.record_cycle('idrac', tick, started, time.time(), self.interval)
+        open_circuits = breaker.open_circuits()
+        if open_circuits:
+            log.warning(f"Skipping {len(open_circuits)} iDRACs with open circuits: {', '.join(open_circuits)}")
+
+    async def discover(self, deadline: float):
+        # Probe the service root of the nodes not probed yet, or whose probe
+        # failed PROBE_RETRY cycles ago, for $select support. A node whose
+        # probe fails is polled without $select until it is probed again.
+        if not self.fetch_config['select']:
+            return {}
+        now   = time.monotonic()
+        nodes = [node for node in self.nodelist
+                 if node not in self.select or self.probe_after.get(node, now) < now]
+        if not nodes:
+            return {}
+        urls   = [f"https://{node}/redfish/v1" for node in nodes]
+        roots  = await process.fetch_all(urls, session=self.session, limiter=self.limiter,
+                                         deadline=deadline)
+        probed = {}
+        for node, root in zip(nodes, roots):
+            if isinstance(root, dict) and root:
+                features = root.get('ProtocolFeaturesSupported', {})
+                probed[node] = 'select' if features.get('SelectQuery') else 'plain'
+                self.probe_after.pop(node, None)
+            else:
+                probed[node] = 'plain'
+                self.probe_after[node] = time.monotonic() + PROBE_RETRY * self.interval
+        return probed
+
+    def url(self, node: str, api: str):
+        if self.select.get(node) == 'select':
+            return process.pull_select_url(f"https://{node}{api}", self.plans)
+        return f"https://{node}{api}"
+
+    def check_select(self, redfish_report: list):
+        # A node that rejected a $select request is polled without $select in
+        # the next cycle; if that is answered, it stays without $select.
+        # Requests that fail for other reasons (timeouts, reboots, open
+        # circuits) do not change the state.
+        for i, node in enumerate(self.nodelist):
+            state = self.select.get(node)
+            if state not in ('select', 'trial'):
+                continue
+            reports  = redfish_report[i::len(self.nodelist)]
+            rejected = any(isinstance(report, process.Rejected) for report in reports)
+            answered = any(isinstance(report, dict) and report for report in reports)
+            if state == 'select' and rejected:
+                self.select[node] = 'trial'
+            elif state == 'trial' and rejected:
+                # Rejected without $select too, it was not the cause
+                self.select[node] = 'select'
+            elif state == 'trial' and answered:
+                self.select[node] = 'plain'
+                log.info(f"{node} rejects $select requests, polling its full resources")
+
+    def prepare(self):
+        if self.conn is None or self.conn.closed:
+            self.conn     = psycopg2.connect(self.connection)
+            self.managers = {}
+        if self.fqdd_map is None:
+            self.fqdd_map   = Interner(self.connection, 'fqdd', utils.get_fqdd_source_map(self.conn, 'fqdd'))
+            self.source_map = Interner(self.connection, 'source', utils.get_fqdd_source_map(self.conn, 'source'))
+        # Loaded on the first cycle, then reloaded for nodes added to the
+        # database since, at most once every 10 cycles
+        if self.last_reload is None or any(node not in self.nodeid_map for node in self.nodelist) \
+           and time.monotonic() - self.last_reload >= 10 * self.interval:
+            self.nodeid_map  = utils.get_nodeid_map(self.conn)
+            self.last_reload = time.monotonic()
+            self.conn.commit()
+
+    def write(self, timestamp, redfish_report: list):
+        processed_records = process.process_all_idracs_pull(self.api, timestamp, self.plans,
+                                                           self.nodelist, redfish_report, self.nodeid_map,
+                                                           self.source_map, self.fqdd_map)
+        if not self.band:
+            writer.copy_batch(self.conn, self.managers, self.cols, processed_records)
+            return
+        selected = {table_name: self.band.select(table_name, records)
+                    for table_name, records in processed_records.items()}
+        writer.copy_batch(self.conn, self.managers, self.cols,
+                          {table_name: kept for table_name, (kept, _) in selected.items()})
+        # The deadband state advances only once the records are written
+        for table_name, (_, pending) in selected.items():
+            self.band.commit(table_name, pending)
 
 
 def get_idrac_metrics_push(nodelist: list, idrac_metrics: list, username: str, password: str,
                           connection: str, nodeid_map: dict, source_map: dict,
-                          fqdd_map: dict, metric_dtype_mapping: dict):
-    with psycopg2.connect(connection) as conn:
-        while True:
-            asyncio.run(listen_process_write_idrac_push(nodelist, idrac_metrics, username, password,
-                                                       conn, nodeid_map, source_map,
-                                                       fqdd_map, metric_dtype_mapping))
+                          fqdd_map: dict, metric_dtype_mapping: dict, batch_config: dict,
+                          stream_config: dict, ring_name: str = None, spool_config: dict = None,
+                          exporter_config: dict = None, worker: int = 0, deadband_config: dict = None):
+    cols = ('timestamp', 'nodeid', 'source', 'fqdd', 'value')
+    exporter.start(exporter_config, worker)
+    # With a ring buffer, records are written by dedicated writer processes
+    ring  = RingBuffer.attach(ring_name) if ring_name else None
+    spool = writer.start_spool(connection, cols, spool_config)
+    # A node is always listened to by the same process, which keeps its last values
+    band  = deadband.from_config(deadband_config)
+    while True:
+        asyncio.run(listen_process_write_idrac_push(nodelist, idrac_metrics, username, password,
+                                                   connection, nodeid_map, source_map,
+                                                   fqdd_map, metric_dtype_mapping, batch_config,
+                                                   stream_config, ring, spool, band))
 
 
 async def listen_process_write_idrac_push(nodelist: list, idrac_metrics: list, username: str, password: str,
-                                         conn: object, nodeid_map: dict, source_map: dict,
-                                         fqdd_map: dict, metric_dtype_mapping: dict):
-    buf_size = 1024 * 1024 * 10
+                                         connection: str, nodeid_map: dict, source_map: dict,
+                                         fqdd_map: dict, metric_dtype_mapping: dict, batch_config: dict,
+                                         stream_config: dict, ring: object = None, spool: object = None,
+                                         band: object = None):
+    # Bounded in reports, so a slow database stalls the readers instead of
+    # growing the memory
+    buf_size = batch_config['queue_size']
     # Metrics read queue
     mr_queue = asyncio.Queue(maxsize=buf_size)
     # Metrics process queue
     mp_queue = asyncio.Queue(maxsize=buf_size)
 
-    listen_task = [asyncio.create_task(process.listen_idrac_push(node, username, password, mr_queue)) for node in
-                   nodelist]
+    # Paces the reconnects of the streams and closes the stalled ones
+    supervisor = Supervisor(nodelist, stream_config['backoff_base'], stream_config['backoff_max'],
+                            stream_config['stall_timeout'], stream_config['startup_spread'],
+                            stream_config['report_interval'])
+    session = process.new_push_session(username, password, stream_config['read_bufsize'])
+
+    listen_task = [asyncio.create_task(process.listen_idrac_push(node, session, mr_queue,
+                                                                 supervisor)) for node in nodelist]
+    watchdog_task = [asyncio.create_task(supervisor.watchdog())]
+
+    # Computed when scraped
+    exporter.QUEUE_DEPTH.track(lambda: {('mr_queue',): mr_queue.qsize(), ('mp_queue',): mp_queue.qsize()})
+    exporter.EVENT_AGE.track(supervisor.event_ages)
+    exporter.STREAMS.track(lambda: {(): sum(state.connected for state in supervisor.states.values())})
+    exporter.RECONNECTS.track(lambda: {(): sum(state.reconnects for state in supervisor.states.values())})
     process_task = [asyncio.create_task(process.process_idrac_push(mr_queue, mp_queue, idrac_metrics))]
-    write_task = [asyncio.create_task(
-        process.write_idrac_push(conn, nodeid_map, source_map, fqdd_map, metric_dtype_mapping, mp_queue))]
+    if ring:
+        write_task = [asyncio.create_task(
+            process.forward_idrac_push(nodeid_map, source_map, fqdd_map, metric_dtype_mapping,
+                                       mp_queue, ring, spool, band))]
+    else:
+        write_task = [asyncio.create_task(
+            process.write_idrac_push(connection, nodeid_map, source_map, fqdd_map, metric_dtype_mapping,
+                                     mp_queue, batch_config, spool, band))]
 
-    tasks = listen_task + process_task + write_task
-    await asyncio.gather(*tasks)
+    tasks = listen_task + watchdog_task + process_task + write_task
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        await session.close()
@@ -1,22 +1,27 @@
+import exporter
 import process
 
 
 def get_pdu_metrics_pull(pdu_api: list, timestamp, pdu_list: list, 
-                         username: str, password: str, nodeid_map: dict):
+                         username: str, password: str, nodeid_map: dict, deadline: float = None):
 
     urls = [f"https://{node}{url}" for url in pdu_api for node in pdu_list]
-    redfish_report = process.run_fetch_all(urls, username, password)
+    redfish_report = process.run_fetch_all(urls, username, password, deadline)
     if redfish_report:
         processed_records = process.process_all_pdu_pull(pdu_api, timestamp, pdu_list, redfish_report, nodeid_map)
         return processed_records
 
 
 
-def get_irc_metrics_snmp(timestamp, irc_list: list, username: str, nodeid_map: dict):
+def get_irc_metrics_snmp(timestamp, irc_list: list, username: str, nodeid_map: dict,
+                         deadline: float = None):
     """
     Get the metrics definition via SNMP.
     """
-    irc_metrics = process.run_snmp_all(irc_list, username)
+    irc_metrics = process.run_snmp_all(irc_list, username, deadline)
+    for irc_ip, metrics in zip(irc_list, irc_metrics):
+        if not metrics:
+            exporter.FETCH_ERRORS.inc((irc_ip,))
     if irc_metrics:
         processed_records = process.process_all_irc_metrics(timestamp, irc_metrics, nodeid_map)
         return processed_records
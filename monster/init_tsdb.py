@@ -2,6 +2,7 @@ import psycopg2
 
 import sql
 import idrac
+import extract
 import logger
 import schema
 import asyncio
@@ -24,6 +25,10 @@ def init_tsdb(config):
     idrac_api          = utils.get_idrac_api(config)
     idrac_model        = utils.get_idrac_model(config)
     idrac_metrics      = utils.get_idrac_metrics(config)
+    compress_after     = utils.get_compression_config(config)['compress_after']
+    aggregate_config   = utils.get_aggregate_config(config)
+    retention_config   = utils.get_retention_config(config)
+    chunk_config       = utils.get_chunk_config(config)
     valid_nodelist     = []
 
     utils.print_status('Getting', 'nodes' , 'metadata')
@@ -37,7 +42,8 @@ def init_tsdb(config):
     if idrac_model == 'push':
         fqdd_source_metadata = idrac.get_fqdd_source_push(nodelist, username, password)
     elif idrac_model == 'pull':
-        fqdd_source_metadata = idrac.get_fqdd_source_pull(nodelist, idrac_api, idrac_metrics,
+        plans = extract.compile_plans(idrac_metrics, utils.get_idrac_extract_specs(config))
+        fqdd_source_metadata = idrac.get_fqdd_source_pull(nodelist, idrac_api, plans,
                                                          username, password)
     if DEBUG:
         print(fqdd_source_metadata)
@@ -46,7 +52,7 @@ def init_tsdb(config):
     if idrac_model == 'push':
         metric_definitions = idrac.get_metric_definitions_push(valid_nodelist, idrac_metrics, username, password)
     elif idrac_model == 'pull':
-        metric_definitions = idrac.get_metric_definitions_pull(idrac_metrics)
+        metric_definitions = idrac.get_metric_definitions_pull(plans)
     
     if DEBUG:
         print(metric_definitions)
@@ -54,6 +60,13 @@ def init_tsdb(config):
     idrac_table_schemas = schema.build_idrac_table_schemas(metric_definitions)
     slurm_table_schemas = schema.build_slurm_table_schemas()
 
+    # Seconds between the rows of a series of each table; pull-mode iDRAC
+    # metrics are read once per poll
+    sensing_intervals = {f"idrac.{metric['Id']}".lower():
+                         utils.parse_duration(metric.get('SensingInterval')) or utils.poll_intervals['idrac']
+                         for metric in metric_definitions}
+    nodes = len(valid_nodelist) or len(nodelist)
+
     with psycopg2.connect(connection) as conn:
         cur = conn.cursor()
 
@@ -87,10 +100,25 @@ def init_tsdb(config):
             table_name = s.split(' ')[5]
             cur.execute(s)
 
-            # Create hypertable
-            create_hypertable_sql = "SELECT create_hypertable(" + "'" \
-                                    + table_name + "', 'timestamp', if_not_exists => TRUE);"
-            cur.execute(create_hypertable_sql)
+            # Create hypertable, with chunks of about the target size
+            if table_name.startswith('idrac.'):
+                chunk_seconds = sql.estimate_chunk_interval(sensing_intervals[table_name.lower()], nodes,
+                                                            chunk_config['series_per_node'], chunk_config)
+            else:
+                chunk_seconds = sql.estimate_chunk_interval(utils.poll_intervals['slurm'], nodes, 1,
+                                                            chunk_config)
+            cur.execute(sql.generate_hypertable_sql(table_name, chunk_seconds))
+            sql.create_indexes(conn, table_name)
+            sql.enable_compression(conn, table_name, compress_after)
+            sql.set_retention(conn, table_name, retention_config['raw'].get(table_name.split('.')[0], 0))
+
+        # Create continuous aggregates of the numeric metric tables
+        for table_name, value_type in sql.get_value_types(conn, ['idrac', 'slurm']).items():
+            if value_type in utils.numeric_types:
+                sql.create_aggregates(conn, table_name, aggregate_config)
+                for bucket in aggregate_config['buckets']:
+                    sql.set_retention(conn, f"{table_name}_agg_{bucket}",
+                                      retention_config['aggregates'].get(bucket, 0))
 
         # Create table for jobs info
         slurm_job_sql = sql.generate_slurm_job_table_sql('slurm')
@@ -98,6 +126,7 @@ def init_tsdb(config):
         for s in slurm_job_sql['tables_sql']:
             table_name = s.split(' ')[5]
             cur.execute(s)
+            sql.create_indexes(conn, table_name)
 
         # Create table for metric definitions
         if idrac_model == 'push':
@@ -119,7 +148,10 @@ def init_tsdb_infra(config):
 
     Initialize TimeScaleDB for infrastructure
     """
-    connection = utils.init_tsdb_connection(config)
+    connection     = utils.init_tsdb_connection(config)
+    compress_after = utils.get_compression_config(config)['compress_after']
+    irc_retention  = utils.get_retention_config(config)['raw'].get('irc', 0)
+    chunk_config   = utils.get_chunk_config(config)
     
     # Generate metadata for the infrastructures
     infras_ip_list = {}
@@ -163,10 +195,13 @@ def init_tsdb_infra(config):
         for s in infra_irc_sqls['tables_sql']:
             table_name = s.split(' ')[5]
             cur.execute(s)
-            # Create hypertable
-            create_hypertable_sql = "SELECT create_hypertable(" + "'" \
-                                    + table_name + "', 'timestamp', if_not_exists => TRUE);"
-            cur.execute(create_hypertable_sql)
+            # Create hypertable, with chunks of about the target size
+            chunk_seconds = sql.estimate_chunk_interval(utils.poll_intervals['irc'],
+                                                        len(infras_ip_list.get('irc', [])), 1, chunk_config)
+            cur.execute(sql.generate_hypertable_sql(table_name, chunk_seconds))
+            sql.create_indexes(conn, table_name)
+            sql.enable_compression(conn, table_name, compress_after)
+            sql.set_retention(conn, table_name, irc_retention)
 
         # Write IRC metric definitions
         metric_def_sql = sql.generate_metric_def_table_sql_irc()
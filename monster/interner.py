@@ -0,0 +1,146 @@
+import time
+import asyncio
+import threading
+from collections import deque
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+import logger
+
+log = logger.get_logger(__name__)
+
+
+class Interner:
+    """
+    Map names to their ids in the `fqdd` or `source` table. Unknown names,
+    e.g. the FQDD of a swapped GPU, are registered in the table on the fly
+    instead of failing the lookup. Registration runs under a transaction-level
+    advisory lock, so every collector process that meets the same new name
+    gets the same id; the table is the registry shared by all processes.
+    """
+    def __init__(self, connection: str, table: str, mapping: dict = None):
+        self.connection = connection
+        self.table      = table
+        self.mapping    = dict(mapping or {})
+        self.conn       = None
+        self.lock       = threading.Lock()
+
+    def __getstate__(self):
+        # The connection and the lock stay in the process that opened them
+        state = self.__dict__.copy()
+        state['conn'] = None
+        state['lock'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def __getitem__(self, name: str):
+        try:
+            return self.mapping[name]
+        except KeyError:
+            self.resolve([name])
+            return self.mapping[name]
+
+    def __contains__(self, name: str):
+        return name in self.mapping
+
+    def resolve(self, names):
+        # Make sure all names have an id, registering the missing ones in one go
+        missing = {name for name in names if name not in self.mapping}
+        if missing:
+            self.register(missing)
+
+    def register(self, names: set):
+        with self.lock:
+            names = [name for name in names if name not in self.mapping]
+            if not names:
+                return
+            if self.conn is None or self.conn.closed:
+                self.conn = psycopg2.connect(self.connection)
+            table = self.table
+            try:
+                with self.conn.cursor() as cur:
+                    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (table,))
+                    # Another process may have registered some of them already
+                    cur.execute(f"SELECT id, {table} FROM {table} WHERE {table} = ANY(%s)", (names,))
+                    found = {name: id for (id, name) in cur.fetchall()}
+                    new_names = [name for name in names if name not in found]
+                    if new_names:
+                        cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+                        (max_id,) = cur.fetchone()
+                        new_ids = {name: max_id + i + 1 for i, name in enumerate(new_names)}
+                        execute_values(cur, f"INSERT INTO {table} (id, {table}) VALUES %s",
+                                       [(id, name) for name, id in new_ids.items()])
+                        found.update(new_ids)
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            self.mapping.update(found)
+            if new_names:
+                log.info(f"Registered new {table} entries: {', '.join(new_names)}")
+
+
+class PushResolver:
+    """
+    Register the sources and fqdds of push reports never seen before on a
+    thread, so the streams on the event loop do not wait for the database.
+    Reports whose names cannot be registered, e.g. while the database is
+    down, are kept, up to `max_reports`, and retried every `retry_interval`
+    seconds instead of being dropped.
+    """
+    def __init__(self, source_map: Interner, fqdd_map: Interner,
+                 max_reports: int = 10000, retry_interval: float = 5.0):
+        self.source_map     = source_map
+        self.fqdd_map       = fqdd_map
+        self.max_reports    = max_reports
+        self.retry_interval = retry_interval
+
+        self.deferred = deque()
+        self.retry_at = 0.0
+
+    async def ready(self, report: tuple = None):
+        # The (ip, metrics) reports whose names all have ids: the deferred
+        # ones once they can be registered, and `report` if given
+        ready = []
+        if self.deferred and time.monotonic() >= self.retry_at:
+            if await self.resolve([metrics for _, metrics in self.deferred]):
+                log.info(f"Registered the names of {len(self.deferred)} deferred reports")
+                ready.extend(self.deferred)
+                self.deferred.clear()
+            else:
+                self.retry_at = time.monotonic() + self.retry_interval
+        if report is not None:
+            # No new attempt while the deferred reports wait for their retry
+            if await self.resolve([report[1]], attempt=not self.deferred):
+                ready.append(report)
+            else:
+                self.defer(report)
+        return ready
+
+    async def resolve(self, reports: list, attempt: bool = True):
+        sources = {metric['source'] for metrics in reports for values in metrics.values() for metric in values}
+        fqdds   = {metric['fqdd'] for metrics in reports for values in metrics.values() for metric in values}
+        if all(name in self.source_map for name in sources) and all(name in self.fqdd_map for name in fqdds):
+            return True
+        if not attempt:
+            return False
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self.source_map.resolve, sources)
+            await loop.run_in_executor(None, self.fqdd_map.resolve, fqdds)
+            return True
+        except Exception as err:
+            log.error(f"Cannot register new sources and fqdds, retry in {self.retry_interval} s: {err}")
+            return False
+
+    def defer(self, report: tuple):
+        if len(self.deferred) >= self.max_reports:
+            ip, _ = self.deferred.popleft()
+            log.error(f"Too many reports with unregistered names, dropping the oldest one from {ip}")
+        if not self.deferred:
+            self.retry_at = time.monotonic() + self.retry_interval
+        self.deferred.append(report)
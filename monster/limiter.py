@@ -0,0 +1,78 @@
+import time
+import asyncio
+
+import exporter
+import logger
+
+log = logger.get_logger(__name__)
+
+
+class AdaptiveLimiter:
+    """
+    Bound the concurrent requests to the BMCs, in total and per host. The
+    total limit adapts between `minimum` and `maximum`: it grows by one for
+    each request answered within `latency_target` seconds while at least half
+    of the limit is in use, and shrinks by `backoff` when requests are slow or
+    fail, at most once per `latency_target` seconds. Hosts that failed their
+    last requests do not move the limit, so a few dead BMCs do not throttle
+    the rest, and neither do requests cancelled at the cycle deadline.
+    """
+    def __init__(self, initial: int = 32, minimum: int = 4, maximum: int = 256,
+                 per_host: int = 2, latency_target: float = 2.0, backoff: float = 0.75):
+        self.limit          = float(initial)
+        self.minimum        = minimum
+        self.maximum        = maximum
+        self.per_host       = per_host
+        self.latency_target = latency_target
+        self.backoff        = backoff
+
+        self.inflight      = 0
+        self.condition     = asyncio.Condition()
+        self.hosts         = {}
+        self.failures      = {}
+        self.last_decrease = 0.0
+        exporter.FETCH_LIMIT.set((), self.limit)
+
+    async def acquire(self, host: str):
+        if host not in self.hosts:
+            self.hosts[host] = asyncio.Semaphore(self.per_host)
+        await self.hosts[host].acquire()
+        try:
+            async with self.condition:
+                await self.condition.wait_for(lambda: self.inflight < int(self.limit))
+                self.inflight += 1
+        except BaseException:
+            self.hosts[host].release()
+            raise
+
+    async def release(self, host: str, latency: float, ok: bool):
+        self.hosts[host].release()
+        exporter.FETCH_SECONDS.observe(latency, (host,))
+        down = self.failures.get(host, 0) >= 2
+        self.failures[host] = 0 if ok else self.failures.get(host, 0) + 1
+        async with self.condition:
+            self.inflight -= 1
+            if not down:
+                self.adapt(latency, ok)
+            self.condition.notify_all()
+
+    async def cancel(self, host: str):
+        # Free the slot of a request shed at the cycle deadline: it says
+        # nothing about the host or the limit
+        self.hosts[host].release()
+        async with self.condition:
+            self.inflight -= 1
+            self.condition.notify_all()
+
+    def adapt(self, latency: float, ok: bool):
+        now = time.monotonic()
+        if ok and latency <= self.latency_target:
+            if self.inflight * 2 >= self.limit and self.limit < self.maximum:
+                self.limit = min(self.maximum, self.limit + 1)
+                exporter.FETCH_LIMIT.set((), self.limit)
+        elif now - self.last_decrease >= self.latency_target:
+            self.limit = max(self.minimum, self.limit * self.backoff)
+            self.last_decrease = now
+            exporter.FETCH_LIMIT.set((), self.limit)
+            log.info(f"Request concurrency lowered to {int(self.limit)} "
+                     f"({'slow' if ok else 'failed'} request, {latency:.1f} s)")
@@ -7,18 +7,22 @@ from pathlib import Path
 def setup_logger(file_name):
     monster_path = Path(__file__).resolve().parent.parent
     log_format = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    # The log level can be lowered (e.g. to INFO) in the environment to see
+    # the collectors' periodic statistics
+    log_level = os.environ.get('monster_log_level', 'ERROR').upper()
 
     logger = logging.getLogger(file_name)
+    logger.setLevel(log_level)
     formatter = logging.Formatter(log_format)
 
     log_handler = TimedRotatingFileHandler(filename=f'{monster_path}/log/monster.log', when="midnight", interval=1,
                                            backupCount=7)
-    log_handler.setLevel(logging.ERROR)
+    log_handler.setLevel(log_level)
     log_handler.setFormatter(formatter)
 
     if not logger.handlers:
         stream_handler = logging.StreamHandler()
-        stream_handler.setLevel(logging.ERROR)
+        stream_handler.setLevel(log_level)
         stream_handler.setFormatter(formatter)
 
         logger.addHandler(stream_handler)
@@ -0,0 +1,73 @@
+import psycopg2
+
+import sql
+import logger
+from monster import utils
+
+log = logger.get_logger(__name__)
+
+
+def format_size(size: int):
+    for unit in ['B', 'kB', 'MB', 'GB']:
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def get_retention_targets(conn: object, retention_config: dict):
+    # (relation, hypertable holding its chunks, retention in days) of the
+    # metric hypertables and their continuous aggregates
+    targets = []
+    for table_name in sql.get_hypertables(conn, utils.metric_schemas):
+        drop_after = retention_config['raw'].get(table_name.split('.')[0], 0)
+        targets.append((table_name, table_name, drop_after))
+    for view_name, hypertable in sql.get_continuous_aggregates(conn, utils.metric_schemas).items():
+        bucket = view_name.rsplit('_agg_', 1)[-1]
+        targets.append((view_name, hypertable, retention_config['aggregates'].get(bucket, 0)))
+    return targets
+
+
+def maintain_tsdb(config):
+    """maintain_tsdb Apply the retention policies
+
+    Set the retention policy of every metric hypertable and continuous
+    aggregate from the configuration, drop the chunks already past it and
+    report what was reclaimed. Can be run periodically, e.g. from cron.
+    """
+    connection       = utils.init_tsdb_connection(config)
+    retention_config = utils.get_retention_config(config)
+    dropped_chunks   = 0
+    reclaimed        = 0
+
+    utils.print_status('Applying', 'retention', 'policies')
+    with psycopg2.connect(connection) as conn:
+        for relation, hypertable, drop_after in get_retention_targets(conn, retention_config):
+            try:
+                chunks, size = sql.get_storage(conn, hypertable)
+                sql.set_retention(conn, relation, drop_after)
+                dropped = sql.drop_expired_chunks(conn, relation, drop_after) if drop_after else []
+                conn.commit()
+            except Exception as err:
+                conn.rollback()
+                log.error(f"Cannot apply the retention of {relation}: {err}")
+                print(f"{relation}: cannot apply the retention: {err}")
+                continue
+
+            if not drop_after:
+                print(f"{relation}: kept forever, {chunks} chunks, {format_size(size)}")
+                continue
+            size_after = sql.get_storage(conn, hypertable)[1]
+            dropped_chunks += len(dropped)
+            reclaimed      += max(0, size - size_after)
+            print(f"{relation}: {drop_after} days, dropped {len(dropped)} of {chunks} chunks, "
+                  f"reclaimed {format_size(max(0, size - size_after))}")
+
+    log.info(f"Retention dropped {dropped_chunks} chunks, reclaimed {format_size(reclaimed)}")
+    utils.print_status('Reclaimed', format_size(reclaimed), f'in {dropped_chunks} chunks')
+
+
+if __name__ == '__main__':
+    config = utils.parse_config()
+
+    maintain_tsdb(config)
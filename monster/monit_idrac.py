@@ -1,34 +1,53 @@
+import asyncio
 import multiprocessing
-import time
 import psycopg2
-import schedule
-from pgcopy import CopyManager
-from datetime import datetime, timezone
 
+import exporter
+import extract
 import idrac
+import logger
 from monster import utils
+from interner import Interner
+from ringbuffer import RingBuffer
+from writer import run_ring_writer
+
+log = logger.get_logger(__name__)
+
+# Seconds between the checks of the writer processes
+WRITER_CHECK_INTERVAL = 5
 
 
 def monit_idrac_pull(config):
-    cols = ('timestamp', 'nodeid', 'source', 'fqdd', 'value')
     connection         = utils.init_tsdb_connection(config)
     username, password = utils.get_idrac_auth()
     nodelist           = utils.get_nodelist(config)
     idrac_api          = utils.get_idrac_api(config)
     idrac_metrics      = utils.get_idrac_metrics(config)
+    extract_specs      = utils.get_idrac_extract_specs(config)
+    fetch_config       = utils.get_idrac_fetch_config(config)
+    deadband_config    = utils.get_idrac_deadband_config(config)
+    scheduling_config  = utils.get_scheduling_config(config)
 
-    with psycopg2.connect(connection) as conn:
-        nodeid_map = utils.get_nodeid_map(conn)
-        fqdd_map   = utils.get_fqdd_source_map(conn, 'fqdd')
-        source_map = utils.get_fqdd_source_map(conn, 'source')
-        timestamp  = datetime.now(timezone.utc).replace(microsecond=0)
-        processed_records = idrac.get_idrac_metrics_pull(idrac_api, timestamp, idrac_metrics,
-                                                         nodelist, username, password,
-                                                         nodeid_map, source_map, fqdd_map)
-        for tabel, records in processed_records.items():
-            mgr = CopyManager(conn, tabel, cols)
-            mgr.copy(records)
-        conn.commit()
+    plans  = extract.compile_plans(idrac_metrics, extract_specs)
+    daemon = idrac.IdracPullDaemon(idrac_api, plans, nodelist, username, password,
+                                   connection, fetch_config, interval=utils.poll_intervals['idrac'],
+                                   spread=scheduling_config['spread'],
+                                   deadline=scheduling_config['deadline'],
+                                   deadband_config=deadband_config)
+    asyncio.run(daemon.run())
+
+
+def start_ring_writer(connection: str, rings: list, cols: tuple, batch_config: dict,
+                      spool_config: dict, exporter_config: dict, offset: int):
+    writer = multiprocessing.Process(target=run_ring_writer,
+                                     args=(connection, [ring.name for ring in rings], cols,
+                                           batch_config['max_rows'],
+                                           batch_config['max_delay'],
+                                           batch_config['report_interval'],
+                                           spool_config, exporter_config, offset),
+                                     daemon=True)
+    writer.start()
+    return writer
 
 
 def monit_idrac_push(config):
@@ -36,6 +55,11 @@ def monit_idrac_push(config):
     username, password = utils.get_idrac_auth()
     nodelist           = utils.get_nodelist(config)
     idrac_metrics      = utils.get_idrac_metrics(config)
+    batch_config       = utils.get_idrac_batch_config(config)
+    spool_config       = utils.get_idrac_spool_config(config)
+    stream_config      = utils.get_idrac_stream_config(config)
+    exporter_config    = utils.get_exporter_config(config, 'idrac')
+    deadband_config    = utils.get_idrac_deadband_config(config)
 
     cores = multiprocessing.cpu_count()
     if (len(nodelist) < cores):
@@ -44,15 +68,48 @@ def monit_idrac_push(config):
 
     with psycopg2.connect(connection) as conn:
         nodeid_map           = utils.get_nodeid_map(conn)
-        fqdd_map             = utils.get_fqdd_source_map(conn, 'fqdd')
-        source_map           = utils.get_fqdd_source_map(conn, 'source')
+        fqdd_map             = Interner(connection, 'fqdd', utils.get_fqdd_source_map(conn, 'fqdd'))
+        source_map           = Interner(connection, 'source', utils.get_fqdd_source_map(conn, 'source'))
         metric_dtype_mapping = utils.get_metric_dtype_mapping(conn)
 
-    with multiprocessing.Pool(cores) as pool:
-        pool.starmap(idrac.get_idrac_metrics_push, [(nodelist, idrac_metrics, username, password,
-                                                     connection, nodeid_map, source_map,
-                                                     fqdd_map, metric_dtype_mapping)
-                                                     for nodelist in nodelist_chunks])
+    # Optionally, the listener processes only listen and parse, and hand the
+    # encoded rows to a few writer processes through shared-memory ring buffers
+    rings   = []
+    writers = []
+    writer_processes = min(batch_config['writer_processes'], cores)
+    if writer_processes:
+        cols  = ('timestamp', 'nodeid', 'source', 'fqdd', 'value')
+        rings = [RingBuffer.create(batch_config['ring_size']) for _ in range(cores)]
+        for i in range(writer_processes):
+            writers.append(start_ring_writer(connection, rings[i::writer_processes], cols, batch_config,
+                                             spool_config, exporter_config, cores + i))
+    ring_names = [ring.name for ring in rings] or [None] * cores
+
+    try:
+        with multiprocessing.Pool(cores) as pool:
+            result = pool.starmap_async(idrac.get_idrac_metrics_push,
+                                        [(nodelist, idrac_metrics, username, password,
+                                          connection, nodeid_map, source_map,
+                                          fqdd_map, metric_dtype_mapping, batch_config,
+                                          stream_config, ring_name, spool_config,
+                                          exporter_config, worker, deadband_config)
+                                         for worker, (nodelist, ring_name)
+                                         in enumerate(zip(nodelist_chunks, ring_names))])
+            # Restart the writer processes that die, or their rings fill up
+            # and every batch goes to the spool
+            while not result.ready():
+                result.wait(WRITER_CHECK_INTERVAL)
+                for i, writer in enumerate(writers):
+                    if not writer.is_alive():
+                        log.error(f"Writer process {i} exited with code {writer.exitcode}, restarting it")
+                        writers[i] = start_ring_writer(connection, rings[i::writer_processes], cols,
+                                                       batch_config, spool_config, exporter_config, cores + i)
+            result.get()
+    finally:
+        for writer in writers:
+            writer.terminate()
+        for ring in rings:
+            ring.close()
 
 
 if __name__ == '__main__':
@@ -60,9 +117,7 @@ if __name__ == '__main__':
     
     idrac_model = utils.get_idrac_model(config)
     if idrac_model == "pull":
-        schedule.every().minutes.at(":00").do(monit_idrac_pull, config)
-        while True:
-            schedule.run_pending()
-            time.sleep(1)
+        exporter.start(utils.get_exporter_config(config, 'idrac'))
+        monit_idrac_pull(config)
     elif idrac_model == "push":
         monit_idrac_push(config)
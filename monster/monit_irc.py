@@ -1,15 +1,13 @@
-import time
-import asyncio
 import psycopg2
-import schedule
 from pgcopy import CopyManager
-from datetime import datetime, timezone
 
+import exporter
 import infra
+import scheduling
 from monster import utils
 
 
-def monit_irc(config): 
+def monit_irc(config, timestamp, deadline: float = None):
     cols = ('timestamp', 'nodeid', 'value')
     connection = utils.init_tsdb_connection(config)
     username   = utils.get_irc_auth()
@@ -20,18 +18,21 @@ def monit_irc(config):
     with psycopg2.connect(connection) as conn:
         nodeid_map = utils.get_infra_nodeid_map(conn)
 
-        timestamp  = datetime.now(timezone.utc).replace(microsecond=0)
-        processed_records = infra.get_irc_metrics_snmp(timestamp, irc_list, username, nodeid_map)
+        processed_records = infra.get_irc_metrics_snmp(timestamp, irc_list, username, nodeid_map, deadline)
 
         for tabel, records in processed_records.items():
             mgr = CopyManager(conn, tabel, cols)
             mgr.copy(records)
         conn.commit()
+        for tabel, records in processed_records.items():
+            exporter.RECORDS.inc((tabel,), len(records))
 
 
 if __name__ == "__main__":
     config = utils.parse_config()
-    schedule.every(2).minutes.at(":00").do(monit_irc, config)
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+    exporter.start(utils.get_exporter_config(config, 'irc'))
+    spread = utils.get_scheduling_config(config)['spread']
+    deadline = utils.get_scheduling_config(config)['deadline']
+    interval = utils.poll_intervals['irc']
+    scheduling.run_every('irc', interval, scheduling.phase_offset('irc', interval, spread),
+                         monit_irc, config, deadline=deadline)
@@ -1,14 +1,13 @@
-import time
 import psycopg2
-import schedule
 from pgcopy import CopyManager
-from datetime import datetime, timezone
 
+import exporter
 import infra
+import scheduling
 from monster import utils
 
 
-def monit_pdu(config): 
+def monit_pdu(config, timestamp, deadline: float = None):
     cols = ('timestamp', 'nodeid', 'value')
     connection         = utils.init_tsdb_connection(config)
     username, password = utils.get_pdu_auth()
@@ -18,18 +17,22 @@ def monit_pdu(config):
     pdu_list = utils.get_infra_ip_list(config, 'pdu')
     with psycopg2.connect(connection) as conn:
         nodeid_map = utils.get_infra_nodeid_map(conn)
-        timestamp  = datetime.now(timezone.utc).replace(microsecond=0)
-        processed_records = infra.get_pdu_metrics_pull(pdu_api, timestamp, pdu_list, username, password, nodeid_map)
+        processed_records = infra.get_pdu_metrics_pull(pdu_api, timestamp, pdu_list, username, password,
+                                                       nodeid_map, deadline)
 
         for tabel, records in processed_records.items():
             mgr = CopyManager(conn, tabel, cols)
             mgr.copy(records)
         conn.commit()
+        for tabel, records in processed_records.items():
+            exporter.RECORDS.inc((tabel,), len(records))
 
 
 if __name__ == "__main__":
     config = utils.parse_config()
-    schedule.every(1).minutes.at(":00").do(monit_pdu, config)
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+    exporter.start(utils.get_exporter_config(config, 'pdu'))
+    spread = utils.get_scheduling_config(config)['spread']
+    deadline = utils.get_scheduling_config(config)['deadline']
+    interval = utils.poll_intervals['pdu']
+    scheduling.run_every('pdu', interval, scheduling.phase_offset('pdu', interval, spread),
+                         monit_pdu, config, deadline=deadline)
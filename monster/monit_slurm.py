@@ -1,19 +1,16 @@
-import time
 import psycopg2
-import schedule
 import urllib3
-from datetime import datetime, timezone
 
+import exporter
 import process
+import scheduling
 import slurm
 from monster import utils
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 
-def monit_slurm(config):
-    timestamp = datetime.now(timezone.utc).replace(microsecond=0)
-
+def monit_slurm(config, timestamp, deadline: float = None):
     connection      = utils.init_tsdb_connection(config)
     nodelist        = utils.get_nodelist(config)
     partition       = utils.get_partition(config)
@@ -22,8 +19,8 @@ def monit_slurm(config):
     hostname_id_map = utils.get_hostname_id_map(connection)
     hostname_list   = [ip_hostname_map[ip] for ip in nodelist]
 
-    jobs_metrics  = slurm.get_slurm_jobs_metrics(slurm_config, partition)
-    nodes_metrics = slurm.get_slurm_nodes_metrics(slurm_config, hostname_list)    
+    jobs_metrics  = slurm.get_slurm_jobs_metrics(slurm_config, partition, deadline)
+    nodes_metrics = slurm.get_slurm_nodes_metrics(slurm_config, hostname_list, deadline)    
 
     # Extract job information
     jobs_info = process.process_job_metrics_slurm(jobs_metrics)
@@ -45,7 +42,11 @@ def monit_slurm(config):
 
 if __name__ == "__main__":
     config = utils.parse_config()
-    schedule.every().minutes.at(":00").do(monit_slurm, config)
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+    exporter.start(utils.get_exporter_config(config, 'slurm'))
+    # Phase of the collector within the minute, so the collectors do not hit
+    # the database at the same second
+    spread = utils.get_scheduling_config(config)['spread']
+    deadline = utils.get_scheduling_config(config)['deadline']
+    interval = utils.poll_intervals['slurm']
+    scheduling.run_every('slurm', interval, scheduling.phase_offset('slurm', interval, spread),
+                         monit_slurm, config, deadline=deadline)
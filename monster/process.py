@@ -1,6 +1,7 @@
 import sql
-import json
+import exporter
 import logger
+import time
 import asyncio
 import multiprocessing
 from itertools import repeat
@@ -9,42 +10,152 @@ import aiohttp
 import hostlist
 import requests
 import urllib3
-from aiohttp_sse_client import client as sse_client
-from dateutil.parser import parse
-from pgcopy import CopyManager
 from requests.adapters import HTTPAdapter
 
 import snmp_irc
+import breaker
+import extract
+import sse
+from interner import PushResolver
+from limiter import AdaptiveLimiter
 from monster import utils
+from writer import BatchBuffer, WriterPool, encode_message
 
 log = logger.get_logger(__name__)
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Number of node reports from which pull-mode reports are parsed on a process
+# pool; below it, starting the pool costs more than the parsing (see
+# tools/bench_pull_parse.py)
+PULL_PARALLEL_THRESHOLD = 20000
 
-async def base_fetch(url: str, session: aiohttp.ClientSession, max_retries=3, retry_delay=2):
-    timeout = aiohttp.ClientTimeout(total=45)
 
-    for attempt in range(max_retries):
-        try:
-            async with session.get(url, timeout=timeout, verify_ssl=False) as response:
-                response.raise_for_status()
-                return await response.json()
-        except Exception as err:
-            if attempt + 1 == max_retries:
-                log.error(f"Cannot fetch data from {url} : {err}")
-                return {}
-            await asyncio.sleep(retry_delay)
+class Rejected(dict):
+    # Empty report of a request the service answered but rejected (HTTP 400
+    # or 501) or answered with a body that is not JSON, e.g. for a query
+    # option it does not support; unlike a failed request, retrying it as is
+    # does not help
+    pass
+
+
+def is_rejection(err: Exception):
+    # A body that is not JSON, or HTTP 400 (Bad Request) or 501 (Not Implemented)
+    if isinstance(err, (aiohttp.ContentTypeError, ValueError)):
+        return True
+    return isinstance(err, aiohttp.ClientResponseError) and err.status in (400, 501)
 
 
-async def fetch_all(urls: list, username: str, password: str):
-    async with aiohttp.ClientSession(auth=aiohttp.BasicAuth(username, password)) as session:
-        tasks = []
-        for url in urls:
-            task = asyncio.create_task(base_fetch(url, session))
-            tasks.append(task)
+async def base_fetch(url: str, session: aiohttp.ClientSession, limiter: AdaptiveLimiter,
+                     max_retries=3, retry_delay=2, delay=0.0, deadline: float = None):
+    host = url.split('/')[2]
+    if delay:
+        # Phase of the host within the polling interval
+        await asyncio.sleep(delay)
+
+    # Hosts with an open circuit are skipped until their next probe
+    circuit = breaker.get_circuit(host)
+    if not circuit.allow():
+        return {}
+    # No retries for a host that failed recently
+    attempts = 1 if circuit.failures else max_retries
+
+    shed = False
+    try:
+        for attempt in range(attempts):
+            # Hold a slot only while the request is on the wire, not between retries
+            await limiter.acquire(host)
+            start = time.perf_counter()
+            ok = False
+            # Neither a request nor its retries outlast the deadline (epoch time) of the cycle
+            left = 45 if deadline is None else min(45, max(0.1, deadline - time.time()))
+            timeout = aiohttp.ClientTimeout(total=left)
+            try:
+                async with session.get(url, timeout=timeout, verify_ssl=False) as response:
+                    response.raise_for_status()
+                    data = await response.json()
+                    ok = True
+                    circuit.success()
+                    return data
+            except asyncio.CancelledError:
+                shed = True
+                raise
+            except Exception as err:
+                if is_rejection(err):
+                    # The host is up, but the request is not valid for it
+                    ok = True
+                    circuit.success()
+                    log.error(f"Request {url} rejected: {err}")
+                    exporter.FETCH_ERRORS.inc((host,))
+                    return Rejected()
+                if attempt + 1 == attempts or \
+                   (deadline is not None and time.time() + retry_delay >= deadline):
+                    log.error(f"Cannot fetch data from {url} : {err}")
+                    exporter.FETCH_ERRORS.inc((host,))
+                    circuit.failure()
+                    return {}
+            finally:
+                if shed:
+                    await limiter.cancel(host)
+                else:
+                    await limiter.release(host, time.perf_counter() - start, ok)
+            await asyncio.sleep(retry_delay)
+    except asyncio.CancelledError:
+        if shed:
+            # Still unanswered at the deadline of the cycle: the host hangs
+            circuit.failure()
+        else:
+            circuit.release()
+        raise
+
+
+def pull_select_url(url: str, plans: list):
+    # Request only the metrics of the resource with OData $select. Their items
+    # are inline in the resource, so there is nothing to $expand.
+    resource = url.rstrip('/').split('/')[-1]
+    selected = [plan.spec.get('items', plan.metric).split('/')[0] for plan in plans
+                if plan.resource == resource]
+    if not selected:
+        return url
+    return f"{url}{'&' if '?' in url else '?'}$select={','.join(selected)}"
+
+
+async def fetch_all(urls: list, username: str = None, password: str = None,
+                    session: aiohttp.ClientSession = None, limiter: AdaptiveLimiter = None,
+                    delays: list = None, deadline: float = None):
+    # Without a session, use a throwaway one
+    if session is None:
+        async with aiohttp.ClientSession(auth=aiohttp.BasicAuth(username, password)) as session:
+            return await fetch_all(urls, session=session, limiter=limiter, delays=delays,
+                                   deadline=deadline)
+    if limiter is None:
+        limiter = AdaptiveLimiter()
+    tasks = []
+    for i, url in enumerate(urls):
+        delay = delays[i] if delays else 0.0
+        task = asyncio.create_task(base_fetch(url, session, limiter, delay=delay, deadline=deadline))
+        tasks.append(task)
+    if deadline is None:
         responses = await asyncio.gather(*tasks, return_exceptions=True)
         return responses
 
+    # Shed the requests still pending at the deadline (epoch time) of the cycle
+    _, pending = await asyncio.wait(tasks, timeout=max(0.0, deadline - time.time()))
+    if pending:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        log.warning(f"Shed {len(pending)} of {len(tasks)} requests at the cycle deadline")
+        exporter.SHED_REQUESTS.inc((), len(pending))
+    return [{} if task in pending else task.result() for task in tasks]
+
+
+def new_pull_session(username: str, password: str, keepalive: float = 120):
+    # Long-lived session of the pull daemon; idle connections to the BMCs are
+    # kept open across cycles to save the TLS handshakes. The concurrency is
+    # bounded by the limiter of fetch_all, not by the connector.
+    connector = aiohttp.TCPConnector(ssl=False, keepalive_timeout=keepalive, limit=0)
+    return aiohttp.ClientSession(connector=connector, auth=aiohttp.BasicAuth(username, password))
+
 
 def single_fetch(url: str, username: str, password: str, max_retries=3, retry_delay=2):
     adapter = HTTPAdapter(max_retries, retry_delay)
@@ -61,8 +172,8 @@ def single_fetch(url: str, username: str, password: str, max_retries=3, retry_de
         return {}
 
 
-def run_fetch_all(urls: list, username: str, password: str):
-    return asyncio.run(fetch_all(urls, username, password))
+def run_fetch_all(urls: list, username: str, password: str, deadline: float = None):
+    return asyncio.run(fetch_all(urls, username, password, deadline=deadline))
 
 
 def run_single_snmp(irc_ip: str, username: str):
@@ -75,11 +186,23 @@ def run_single_snmp(irc_ip: str, username: str):
     return {}
 
 
-def run_snmp_all(irc_list: list, username: str):
+def run_snmp_all(irc_list: list, username: str, deadline: float = None):
     metrics_all = []
     snmp_args = zip(irc_list, repeat(username))
     with multiprocessing.Pool() as pool:
-        metrics_all = pool.starmap(run_single_snmp, snmp_args)
+        if deadline is None:
+            metrics_all = pool.starmap(run_single_snmp, snmp_args)
+        else:
+            # IRCs that have not answered by the deadline are shed; leaving
+            # the pool terminates their workers
+            results = [pool.apply_async(run_single_snmp, args) for args in snmp_args]
+            for irc_ip, result in zip(irc_list, results):
+                try:
+                    metrics_all.append(result.get(timeout=max(0.0, deadline - time.time())))
+                except multiprocessing.TimeoutError:
+                    log.warning(f"Shed SNMP request to {irc_ip} at the cycle deadline")
+                    exporter.SHED_REQUESTS.inc()
+                    metrics_all.append({})
     return metrics_all
 
 
@@ -160,7 +283,8 @@ def extract_metadata(system_info: dict, bmc_info: dict, node: str):
         # Todo: Add more checks. Some nodes report hostname as "cpu-24-11.localdomain" (for redraider)
         # On repacss, the hostname is set to c+number, e.g. c001, and g+number, e.g. g001
         # This part is currently hardcoded for the repacss cluster
-        hostname = metrics.get("HostName", None)
+        # Unreachable BMCs have no hostname
+        hostname = metrics.get("HostName", None) or ""
         if (hostname.startswith("c")):
             new_hostname = bmc_ip_addr.replace("10.101.", "rpc-").replace(".", "-")
         elif (hostname.startswith("g")):
@@ -191,14 +315,12 @@ def parallel_extract_metadata(system_info_list: list,
     return info
 
 
-def extract_fqdd_source_pull(redfish_report: list, metrics: list):
+def extract_fqdd_source_pull(redfish_report: list, plans: list):
     fqdd = []
     source = []
     for i in redfish_report:
-        for metric in metrics:
-            for item in i.get(metric, []):
-                f_value = item.get("Name", "None").replace(" ", "_")
-                s_value = item.get("@odata.type", "None")
+        for plan in plans:
+            for f_value, s_value in plan.names(i):
                 if f_value not in fqdd:
                     fqdd.append(f_value)
                 if s_value not in source:
@@ -212,66 +334,103 @@ def extract_fqdd_source_push(telemetry_service: dict):
     return (fqdd, source)
 
 
-def process_all_idracs_pull(idrac_api: list, timestamp, idrac_metrics: list,
+def process_all_idracs_pull(idrac_api: list, timestamp, plans: list,
                            nodelist: list, redfish_report: list,
                            nodeid_map: dict, source_map: dict, fqdd_map: dict):
+    # The redfish report is ordered by API, then by node
+    nodes = nodelist * len(idrac_api)
+    if len(redfish_report) >= PULL_PARALLEL_THRESHOLD:
+        columns = parallel_process_idrac_pull(plans, nodes, redfish_report,
+                                              nodeid_map, source_map, fqdd_map)
+    else:
+        columns = process_idrac_reports_pull(plans, nodes, redfish_report,
+                                             nodeid_map, source_map, fqdd_map)
+
+    # All records of a cycle share the timestamp
     processed_records = {}
-    # Breakdown the redfish report by API
-    idrac_reports = []
-    for i in range(len(idrac_api)):
-        idrac_reports.append(redfish_report[i * len(nodelist): (i + 1) * len(nodelist)])
-
-    for idrac_metric in idrac_metrics:
-        table_name = f"idrac.{idrac_metric.lower()}"
-        for reports in idrac_reports:
-            records = parallel_process_idrac_pull(timestamp, idrac_metric, nodelist,
-                                                 reports, nodeid_map, source_map, fqdd_map)
-            if table_name not in processed_records:
-                processed_records[table_name] = records
-            else:
-                processed_records[table_name].extend(records)
-
+    for table_name, (nodeids, sources, fqdds, values) in columns.items():
+        processed_records[table_name] = list(zip(repeat(timestamp), nodeids, sources, fqdds, values))
     return processed_records
 
 
-def parallel_process_idrac_pull(timestamp, idrac_metric: str, nodelist: list,
-                               reports: list, nodeid_map: dict, source_map: dict,
-                               fqdd_map: dict):
-    records = []
-    process_args = zip(repeat(timestamp), repeat(idrac_metric), nodelist, reports,
-                       repeat(nodeid_map), repeat(source_map), repeat(fqdd_map))
-    with multiprocessing.Pool() as pool:
-        records = pool.starmap(process_node_idrac_pull, process_args)
+def process_idrac_reports_pull(plans: list, nodes: list, reports: list,
+                               nodeid_map: dict, source_map: dict, fqdd_map: dict):
+    """
+    Route the values of all reports to typed per-table columns (nodeid,
+    source, fqdd, value) in a single pass, with the compiled extraction plans
+    of the metrics. A node's items of a metric are dropped together if one of
+    them cannot be processed.
+    """
+    columns = {plan.table_name: ([], [], [], []) for plan in plans}
+    fields  = [(plan.items, plan.extract) + columns[plan.table_name] for plan in plans]
 
-    # Remove empty lists
-    records = [item for sublist in records for item in sublist]
-    return records
+    for node, report in zip(nodes, reports):
+        if not report:
+            continue
+        for get_items, extract_items, nodeids, sources, fqdds, values in fields:
+            items = get_items(report)
+            if not items:
+                continue
+            start = len(values)
+            try:
+                nodeid = nodeid_map[node]
+                extract_items(items, sources, fqdds, values, source_map, fqdd_map)
+                nodeids.extend(repeat(nodeid, len(values) - start))
+            except Exception as err:
+                log.error(f"Cannot process idrac metrics: {err}")
+                del sources[start:], fqdds[start:], values[start:]
+    return {plan.table_name: plan.typed(columns[plan.table_name]) for plan in plans}
+
+
+def resolve_fqdd_source_pull(redfish_report: list, plans: list,
+                             source_map: object, fqdd_map: object):
+    fqdd = set()
+    source = set()
+    for report in redfish_report:
+        if not report:
+            continue
+        for plan in plans:
+            for f_value, s_value in plan.names(report):
+                fqdd.add(f_value)
+                source.add(s_value)
+    try:
+        source_map.resolve(source)
+        fqdd_map.resolve(fqdd)
+    except Exception as err:
+        # Only the records of the unknown names are lost
+        log.error(f"Cannot register new sources or fqdds: {err}")
 
 
-def process_node_idrac_pull(timestamp, idrac_metric: str, node: str, report: list,
-                           nodeid_map: dict, source_map: dict, fqdd_map: dict):
-    records = []
-    # The first item corresponds to the fqdd field
-    # The second item corresponds to the source field
-    # The third item corresponds to the value field
-    field_map = {'Fans': ['FanName', '@odata.type', 'Reading'],
-                 'Temperatures': ['Name', '@odata.type', 'ReadingCelsius'],
-                 'PowerControl': ['Name', '@odata.type', 'PowerConsumedWatts']}
-    fqdd_field = field_map.get(idrac_metric)[0]
-    source_field = field_map.get(idrac_metric)[1]
-    value_field = field_map.get(idrac_metric)[2]
+def parallel_process_idrac_pull(plans: list, nodes: list, reports: list,
+                               nodeid_map: dict, source_map: dict, fqdd_map: dict):
+    # Register sources and fqdds never seen before, then hand plain mappings
+    # and the specs of the plans to the worker processes, once per worker
+    resolve_fqdd_source_pull(reports, plans, source_map, fqdd_map)
+    cores  = min(multiprocessing.cpu_count(), len(nodes))
+    chunks = [(nodes[i::cores], reports[i::cores]) for i in range(cores)]
+    with multiprocessing.Pool(cores, initializer=init_idrac_pull_worker,
+                              initargs=(extract.plan_specs(plans), nodeid_map, source_map.mapping,
+                                        fqdd_map.mapping)) as pool:
+        results = pool.starmap(process_idrac_chunk_pull, chunks)
 
-    if report:
-        try:
-            for item in report.get(idrac_metric, []):
-                fqdd = item.get(fqdd_field, "None").replace(" ", "_")
-                source = item.get(source_field, "None")
-                value = int(item.get(value_field, 0))
-                records.append((timestamp, nodeid_map[node], source_map[source], fqdd_map[fqdd], value))
-        except Exception as err:
-            log.error(f"Cannot process idrac metrics: {err}")
+    columns = results[0]
+    for result in results[1:]:
+        for table_name, table_columns in result.items():
+            for column, values in zip(columns[table_name], table_columns):
+                column.extend(values)
+    return columns
+
+
+def init_idrac_pull_worker(specs: list, nodeid_map: dict, source_map: dict, fqdd_map: dict):
+    # Accessors do not pickle; each worker compiles the plans once
+    global pull_worker_args
+    plans = [extract.ExtractionPlan(metric, spec) for metric, spec in specs]
+    pull_worker_args = (plans, nodeid_map, source_map, fqdd_map)
 
-    return records
+
+def process_idrac_chunk_pull(nodes: list, reports: list):
+    plans, nodeid_map, source_map, fqdd_map = pull_worker_args
+    return process_idrac_reports_pull(plans, nodes, reports, nodeid_map, source_map, fqdd_map)
 
 
 def process_all_pdu_pull(pdu_api: list, timestamp, pdu_list: list, redfish_report: list, nodeid_map: dict):
@@ -435,58 +594,80 @@ def process_node_job_correlation(jobs_metrics: list,
     return records
 
 
-async def listen_idrac_push(node: str, username: str, password: str, mr_queue: asyncio.Queue):
+def new_push_session(username: str, password: str, read_bufsize: int = 64 * 1024):
+    # One connector, and so one SSL context and connection pool, for all the
+    # streams of a worker process, kept across reconnects
+    connector = aiohttp.TCPConnector(ssl=False, force_close=False, limit=0)
+    return aiohttp.ClientSession(connector=connector,
+                                 auth=aiohttp.BasicAuth(username, password),
+                                 timeout=aiohttp.ClientTimeout(total=None, sock_connect=30),
+                                 read_bufsize=read_bufsize)
+
+
+async def listen_idrac_push(node: str, session: aiohttp.ClientSession, mr_queue: asyncio.Queue,
+                            supervisor: object):
     url = f"https://{node}/redfish/v1/SSE?$filter=EventFormatType%20eq%20MetricReport"
+    headers = {'Accept': 'text/event-stream'}
+    await asyncio.sleep(supervisor.startup_delay())
     while True:
         try:
-            async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=False,
-                                                                            force_close=False,
-                                                                            limit=None),
-                                             auth=aiohttp.BasicAuth(username, password),
-                                             timeout=aiohttp.ClientTimeout(total=0)) as session:
-                async with sse_client.EventSource(url,
-                                                  session=session,
-                                                  read_until_eof=True,
-                                                  read_bufsize=1024 * 1024) as event_source:
-                    async for event in event_source:
-                        report = json.loads(event.data)
-                        if report:
-                            await mr_queue.put((node, report))
-                            await asyncio.sleep(0)
-        except Exception as err:
-            log.error(f"Cannot listen to {node}: {err}")
-            await asyncio.sleep(5)
-            continue
+            async with session.get(url, headers=headers) as response:
+                response.raise_for_status()
+                supervisor.connected(node, response)
+                async for data in sse.iter_sse_data(response.content):
+                    supervisor.event(node)
+                    exporter.REPORTS.inc()
+                    # Only keep the fields we store, not the whole report
+                    report_id, metric_values = extract_metric_values_push(sse.loads(data))
+                    if report_id and metric_values:
+                        await mr_queue.put((node, report_id, metric_values))
+                        await asyncio.sleep(0)
+            err = "stream closed"
+        except Exception as e:
+            err = e
+        delay = supervisor.disconnected(node, err)
+        log.error(f"Cannot listen to {node}: {err}, reconnecting in {delay:.1f} s")
+        await asyncio.sleep(delay)
+
+
+def extract_metric_values_push(report: dict):
+    metric_values = []
+    for metric in report.get('MetricValues', []):
+        dell = metric.get('Oem', {}).get('Dell', {})
+        metric_values.append((metric.get('MetricId', None),
+                              metric.get('Timestamp', None),
+                              dell.get('Source', None),
+                              dell.get('FQDD', None),
+                              metric.get('MetricValue', None)))
+    return (report.get('Id', None), metric_values)
 
 
 async def process_idrac_push(mr_queue: asyncio.Queue, mp_queue: asyncio.Queue, idrac_metrics: list):
     while True:
         data = await mr_queue.get()
         ip = data[0]
-        report = data[1]
-        report_id = report.get('Id', None)
-        metric_values = report.get('MetricValues', [])
-        if report_id and metric_values:
-            # print(f"Processing report from {ip}")
-            processed_metrics = single_process_idrac_push(ip, report_id, metric_values, idrac_metrics)
-            if processed_metrics:
-                await mp_queue.put((ip, processed_metrics))
-            mr_queue.task_done()
+        report_id = data[1]
+        metric_values = data[2]
+        # print(f"Processing report from {ip}")
+        processed_metrics = single_process_idrac_push(ip, report_id, metric_values, idrac_metrics)
+        if processed_metrics:
+            await mp_queue.put((ip, processed_metrics))
+        mr_queue.task_done()
 
 
 def single_process_idrac_push(ip: str, report_id: str, metric_values: list, idrac_metrics: list):
+    # Each metric value is a (MetricId, Timestamp, Source, FQDD, MetricValue) tuple
     metrics = {}
-    for metric in metric_values:
-        table_name = metric.get('MetricId', None)
-        timestamp  = metric.get('Timestamp', None)
-        source     = metric.get('Oem', {}).get('Dell', {}).get('Source', None)
-        fqdd       = metric.get('Oem', {}).get('Dell', {}).get('FQDD', None)
-        value      = metric.get('MetricValue', None)
-        
+    # Values of a report share a handful of timestamps, parse each only once
+    timestamps = {}
+    for (table_name, timestamp, source, fqdd, value) in metric_values:
         # if idrac_metrics is empty, we assume all metrics are valid
         if not idrac_metrics or table_name in idrac_metrics:
             if timestamp and source and fqdd and value:
-                parse_timestamp = parse(timestamp).replace(microsecond=0)
+                parse_timestamp = timestamps.get(timestamp)
+                if parse_timestamp is None:
+                    parse_timestamp = utils.parse_redfish_timestamp(timestamp)
+                    timestamps[timestamp] = parse_timestamp
                 record = {
                     'timestamp': parse_timestamp,
                     'source': source,
@@ -500,40 +681,87 @@ def single_process_idrac_push(ip: str, report_id: str, metric_values: list, idra
     return metrics
 
 
-async def write_idrac_push(conn: object, nodeid_map: dict, source_map: dict, fqdd_map: dict,
-                          metric_dtype_mapping: dict, mp_queue: asyncio.Queue):
+async def write_idrac_push(connection: str, nodeid_map: dict, source_map: dict, fqdd_map: dict,
+                          metric_dtype_mapping: dict, mp_queue: asyncio.Queue, batch_config: dict,
+                          spool: object = None, deadband: object = None):
     cols = ('timestamp', 'nodeid', 'source', 'fqdd', 'value')
+    buffer = BatchBuffer(batch_config['max_rows'], batch_config['max_delay'])
+    pool = WriterPool(connection, cols, batch_config['writers'], batch_config['report_interval'], spool)
+    resolver = PushResolver(source_map, fqdd_map)
+    try:
+        while True:
+            # Wait for the next report, but no longer than the oldest buffered
+            # record may wait for its flush
+            try:
+                data = await asyncio.wait_for(mp_queue.get(), timeout=buffer.time_left())
+            except asyncio.TimeoutError:
+                data = None
+
+            for ip, metrics in await resolver.ready(data):
+                try:
+                    node_records = convert_idrac_push(ip, metrics, nodeid_map, source_map,
+                                                      fqdd_map, metric_dtype_mapping, deadband)
+                    for target_table, all_records in node_records.items():
+                        buffer.add(target_table, all_records)
+                except Exception as err:
+                    log.error(f"Cannot write metrics from {ip}: {err}")
+            if data:
+                mp_queue.task_done()
+
+            if buffer.due():
+                await pool.submit(*buffer.take())
+    finally:
+        pool.close()
+
+
+async def forward_idrac_push(nodeid_map: dict, source_map: dict, fqdd_map: dict,
+                             metric_dtype_mapping: dict, mp_queue: asyncio.Queue, ring: object,
+                             spool: object = None, deadband: object = None):
+    # Encode the records and hand them to a writer process through the ring buffer.
+    # If the ring is full, spill them to the spool, or wait without one.
+    resolver = PushResolver(source_map, fqdd_map)
     while True:
         data = await mp_queue.get()
-        ip = data[0]
-        metrics = data[1]
-        nodeid = nodeid_map[ip]
-
-        try:
-            for table_name, table_metrics in metrics.items():
-                all_records = []
-                dtype = metric_dtype_mapping[table_name]
-                target_table = f"idrac.{table_name.lower()}"
-                # print(f"Writing metrics from {ip} to {target_table}")
-
-                for metric in table_metrics:
-                    timestamp = metric['timestamp']
-                    source = source_map[metric['source']]
-                    fqdd = fqdd_map[metric['fqdd']]
-                    value = utils.cast_value_type(metric['value'], dtype)
-                    all_records.append((timestamp, nodeid, source, fqdd, value))
-
-                mgr = CopyManager(conn, target_table, cols)
-                mgr.copy(all_records)
-            conn.commit()
-        except Exception as err:
-            curs = conn.cursor()
-            curs.execute("ROLLBACK")
-            conn.commit()
-            log.error(f"Cannot write metrics from {ip}: {err}")
+        for ip, metrics in await resolver.ready(data):
+            try:
+                node_records = convert_idrac_push(ip, metrics, nodeid_map, source_map,
+                                                  fqdd_map, metric_dtype_mapping, deadband)
+                for target_table, all_records in node_records.items():
+                    message = encode_message(target_table, all_records)
+                    while not ring.put(message):
+                        if spool:
+                            spool.append([message])
+                            exporter.SPOOLED.inc((), len(all_records))
+                            break
+                        await asyncio.sleep(0.01)
+            except Exception as err:
+                log.error(f"Cannot forward metrics from {ip}: {err}")
         mp_queue.task_done()
 
 
+def convert_idrac_push(ip: str, metrics: dict, nodeid_map: dict, source_map: dict,
+                       fqdd_map: dict, metric_dtype_mapping: dict, deadband: object = None):
+    node_records = {}
+    nodeid = nodeid_map[ip]
+    # Sources and fqdds never seen before were registered by the PushResolver
+    for table_name, table_metrics in metrics.items():
+        all_records = []
+        dtype = metric_dtype_mapping[table_name]
+        target_table = f"idrac.{table_name.lower()}"
+
+        for metric in table_metrics:
+            timestamp = metric['timestamp']
+            source = source_map[metric['source']]
+            fqdd = fqdd_map[metric['fqdd']]
+            value = utils.cast_value_type(metric['value'], dtype)
+            all_records.append((timestamp, nodeid, source, fqdd, value))
+        if deadband:
+            all_records = deadband.filter(target_table, all_records)
+        if all_records:
+            node_records[target_table] = all_records
+    return node_records
+
+
 def process_all_irc_metrics(timestamp, irc_metrics, nodeid_map):
     """
     Process the IRC metrics definition.
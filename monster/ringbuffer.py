@@ -0,0 +1,86 @@
+import struct
+from multiprocessing import shared_memory
+
+HEADER = struct.Struct('QQ')
+LENGTH = struct.Struct('I')
+# Length marking that the rest of the ring is unused and the next message
+# starts at the beginning of the data region
+WRAP = 0xFFFFFFFF
+
+
+class RingBuffer:
+    """
+    Single-producer, single-consumer ring buffer of byte messages in shared
+    memory. The header holds the monotonically increasing read (head) and
+    write (tail) offsets; each message is a 4-byte length followed by the
+    payload and never wraps around the end of the data region.
+    """
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm      = shm
+        self.owner    = owner
+        self.buf      = shm.buf
+        self.capacity = shm.size - HEADER.size
+
+    @classmethod
+    def create(cls, capacity: int):
+        shm = shared_memory.SharedMemory(create=True, size=HEADER.size + capacity)
+        HEADER.pack_into(shm.buf, 0, 0, 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str):
+        # Only the creator unlinks the segment
+        shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def put(self, payload: bytes):
+        # Return False if the message does not fit right now
+        size = LENGTH.size + len(payload)
+        # Bigger messages may never fit once the write position is past the middle
+        if size > self.capacity // 2:
+            raise ValueError(f"Message of {len(payload)} bytes exceeds the ring capacity")
+        head, tail = HEADER.unpack_from(self.buf, 0)
+        pos = tail % self.capacity
+        skip = 0
+        if pos + size > self.capacity:
+            # Not enough room before the end, continue at the beginning
+            skip = self.capacity - pos
+        if tail + skip + size - head > self.capacity:
+            return False
+
+        if skip:
+            if skip >= LENGTH.size:
+                LENGTH.pack_into(self.buf, HEADER.size + pos, WRAP)
+            pos = 0
+        start = HEADER.size + pos
+        LENGTH.pack_into(self.buf, start, len(payload))
+        self.buf[start + LENGTH.size: start + size] = payload
+        # Publish the message only after it has been written
+        struct.pack_into('Q', self.buf, 8, tail + skip + size)
+        return True
+
+    def get(self):
+        # Return the next message, or None if the ring is empty
+        head, tail = HEADER.unpack_from(self.buf, 0)
+        if head == tail:
+            return None
+        pos = head % self.capacity
+        if self.capacity - pos < LENGTH.size or \
+           LENGTH.unpack_from(self.buf, HEADER.size + pos)[0] == WRAP:
+            head += self.capacity - pos
+            pos = 0
+        start = HEADER.size + pos
+        (length,) = LENGTH.unpack_from(self.buf, start)
+        payload = bytes(self.buf[start + LENGTH.size: start + LENGTH.size + length])
+        struct.pack_into('Q', self.buf, 0, head + LENGTH.size + length)
+        return payload
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
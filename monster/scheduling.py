@@ -0,0 +1,66 @@
+import time
+import zlib
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+import exporter
+import logger
+
+log = logger.get_logger(__name__)
+
+
+def phase_offset(key: str, interval: float, spread: float = 0.5):
+    # Deterministic offset of `key` within the first `spread` of the interval,
+    # the same in every process and across restarts
+    return zlib.crc32(key.encode('utf-8')) / 2 ** 32 * spread * interval
+
+
+def next_tick(interval: float, offset: float = 0.0, now: float = None):
+    # Epoch time of the next tick at `offset` seconds into an interval,
+    # strictly after `now`
+    now = time.time() if now is None else now
+    return now + ((offset - now) % interval or interval)
+
+
+def bucket_timestamp(tick: float, interval: float):
+    # Start of the interval the tick belongs to; readings are stamped with it
+    return datetime.fromtimestamp(tick - tick % interval, timezone.utc)
+
+
+def run_every(name: str, interval: float, offset: float, func: object, *args, deadline: float = 0.9):
+    """
+    Call `func(*args, timestamp, deadline)` at `offset` seconds into every
+    `interval` seconds, with the aligned timestamp of the interval and the
+    epoch time by which the cycle should be done, `deadline` of the interval
+    after its tick. Cycles run on a worker thread; a tick that comes while the
+    previous cycle is still running is skipped and counted. Cycles are
+    logged and exported under the collector `name`, e.g. 'slurm'.
+    """
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+    running  = None
+    while True:
+        tick = next_tick(interval, offset)
+        time.sleep(max(0.0, tick - time.time()))
+        if running is not None and not running.done():
+            log.warning(f"{name} overran its interval, skipping the tick of {bucket_timestamp(tick, interval)}")
+            exporter.SKIPPED_TICKS.inc((name,))
+            continue
+        running = executor.submit(run_cycle, name, tick, interval, tick + deadline * interval, func, args)
+
+
+def run_cycle(name: str, tick: float, interval: float, deadline: float, func: object, args: tuple):
+    started = time.time()
+    try:
+        func(*args, bucket_timestamp(tick, interval), deadline)
+    except Exception as err:
+        log.error(f"Cannot run {name}: {err}")
+    record_cycle(name, tick, started, time.time(), interval)
+
+
+def record_cycle(name: str, tick: float, started: float, finished: float, interval: float):
+    # A cycle overruns if it ends after the next tick of its phase
+    exporter.CYCLE_SECONDS.observe(finished - started, (name,))
+    exporter.CYCLE_LAG.set((name,), started - tick)
+    if finished > tick + interval:
+        exporter.OVERRUNS.inc((name,))
+        log.warning(f"{name} took {finished - started:.1f} s, longer than its interval of {interval:.0f} s")
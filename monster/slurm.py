@@ -6,6 +6,7 @@ import requests
 from pgcopy import CopyManager
 from requests.adapters import HTTPAdapter
 
+import exporter
 import logger
 import sql
 
@@ -56,24 +57,27 @@ def read_slurm_token(slurm_config: dict):
     return token
 
 
-def call_slurm_api(slurm_config: dict, token: str, url: str):
+def call_slurm_api(slurm_config: dict, token: str, url: str, deadline: float = None):
     metrics = {}
+    # Give up at the deadline (epoch time) of the cycle
+    timeout = max(1.0, deadline - time.time()) if deadline else None
     headers = {"X-SLURM-USER-NAME": slurm_config['user'],
                "X-SLURM-USER-TOKEN": token}
     adapter = HTTPAdapter(max_retries=3)
     with requests.Session() as session:
         session.mount(url, adapter)
         try:
-            response = session.get(url, headers=headers)
+            response = session.get(url, headers=headers, timeout=timeout)
             metrics = response.json()
         except Exception as err:
             log.error(f"Fetch slurm metrics error: {err}")
+            exporter.FETCH_ERRORS.inc((slurm_config['ip'],))
     return metrics
 
 
-def get_slurm_jobs_metrics(slurm_config: dict, partition: str):
+def get_slurm_jobs_metrics(slurm_config: dict, partition: str, deadline: float = None):
     url = f"http://{slurm_config['ip']}:{slurm_config['port']}{slurm_config['slurm_jobs']}"
-    jobs_metric = call_slurm_api(slurm_config, read_slurm_token(slurm_config), url).get('jobs', [])
+    jobs_metric = call_slurm_api(slurm_config, read_slurm_token(slurm_config), url, deadline).get('jobs', [])
     # only keep the jobs in the specified partition
     jobs_metric = [job for job in jobs_metric if job['partition'] == partition]
     return jobs_metric
@@ -125,14 +129,15 @@ def dump_slurm_jobs_info(conn: object, jobs_info: list):
         mgr = CopyManager(conn, target_table, cols)
         mgr.copy(all_records)
         conn.commit()
+        exporter.RECORDS.inc((target_table,), len(all_records))
     except Exception as err:
         curs.execute("ROLLBACK")
         log.error(f"Fail to dump job metrics: {err}")
 
 
-def get_slurm_nodes_metrics(slurm_config: dict, hostname_list: list):
+def get_slurm_nodes_metrics(slurm_config: dict, hostname_list: list, deadline: float = None):
     url = f"http://{slurm_config['ip']}:{slurm_config['port']}{slurm_config['slurm_nodes']}"
-    nodes_metric = call_slurm_api(slurm_config, read_slurm_token(slurm_config), url).get('nodes', [])
+    nodes_metric = call_slurm_api(slurm_config, read_slurm_token(slurm_config), url, deadline).get('nodes', [])
     # only keep the nodes in the specified partition
     nodes_metric = [node for node in nodes_metric if node["hostname"] in hostname_list]
     return nodes_metric
@@ -148,6 +153,7 @@ def dump_slurm_nodes_info(conn: object, nodes_info: dict):
             mgr = CopyManager(conn, target_table, cols)
             mgr.copy(records)
             conn.commit()
+            exporter.RECORDS.inc((target_table,), len(records))
     except Exception as err:
         curs.execute("ROLLBACK")
         log.error(f"Fail to dump node metrics : {err}")
@@ -161,6 +167,7 @@ def dump_slurm_nodes_jobs(conn: object, nodes_jobs: list):
         mgr = CopyManager(conn, target_table, cols)
         mgr.copy(nodes_jobs)
         conn.commit()
+        exporter.RECORDS.inc((target_table,), len(nodes_jobs))
     except Exception as err:
         curs.execute("ROLLBACK")
         log.error(f"Fail to dump node-jobs correlation : {err}")
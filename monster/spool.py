@@ -0,0 +1,148 @@
+import os
+import time
+import struct
+import threading
+
+LENGTH = struct.Struct('I')
+
+
+class Spool:
+    """
+    Append-only on-disk spool of encoded batches. Messages are appended to an
+    open segment file (`*.open`), which is closed (`*.seg`) once it reaches
+    `segment_size` bytes or is `max_age` seconds old. Closed segments are
+    claimed for replay by renaming them, so several processes can share a
+    spool directory. Open and claimed segments are named after the PID and
+    start time of their process, so those of a dead process are claimed
+    even if its PID was reused.
+    """
+    def __init__(self, path: str, segment_size: int = 64 * 1024 * 1024, max_age: float = 10.0):
+        self.path         = path
+        self.segment_size = segment_size
+        self.max_age      = max_age
+
+        self.lock    = threading.Lock()
+        self.file    = None
+        self.name    = None
+        self.size    = 0
+        self.opened  = 0.0
+
+    def append(self, messages: list):
+        with self.lock:
+            if self.file is None:
+                os.makedirs(self.path, exist_ok=True)
+                self.name   = os.path.join(self.path, f"{time.time_ns():020d}-{process_tag()}.open")
+                self.file   = open(self.name, 'ab')
+                self.size   = 0
+                self.opened = time.monotonic()
+            for message in messages:
+                self.file.write(LENGTH.pack(len(message)))
+                self.file.write(message)
+                self.size += LENGTH.size + len(message)
+            # Hand the data to the OS so it survives a crash of the collector
+            self.file.flush()
+            if self.size >= self.segment_size:
+                self.close_segment()
+
+    def rotate(self):
+        # Close the open segment once it is old enough to be replayed
+        with self.lock:
+            if self.file is not None and time.monotonic() - self.opened >= self.max_age:
+                self.close_segment()
+
+    def close_segment(self):
+        self.file.close()
+        os.rename(self.name, self.name[:-len('.open')] + '.seg')
+        self.file = None
+        self.name = None
+
+    def claim(self):
+        # Closed segments, and segments left behind by dead processes, oldest first
+        claimed = []
+        try:
+            names = sorted(os.listdir(self.path))
+        except FileNotFoundError:
+            return claimed
+        for name in names:
+            stem, ext = os.path.splitext(name)
+            if ext == '.seg' or (ext in ('.open', '.replay') and not owner_alive(stem)):
+                source = os.path.join(self.path, name)
+                target = os.path.join(self.path, f"{stem.split('-')[0]}-{process_tag()}.replay")
+                try:
+                    os.rename(source, target)
+                except FileNotFoundError:
+                    # Claimed by another process
+                    continue
+                claimed.append(target)
+        return claimed
+
+    def read(self, segment: str):
+        with open(segment, 'rb') as f:
+            data = f.read()
+        messages = []
+        pos = 0
+        while pos + LENGTH.size <= len(data):
+            (length,) = LENGTH.unpack_from(data, pos)
+            pos += LENGTH.size
+            if pos + length > len(data):
+                # Truncated by a crash while appending
+                break
+            messages.append(data[pos:pos + length])
+            pos += length
+        return messages
+
+    def release(self, segment: str, done: bool):
+        if done:
+            os.remove(segment)
+        else:
+            os.rename(segment, segment[:-len('.replay')] + '.seg')
+
+    def pending(self):
+        # Number and size in bytes of the segments waiting for replay
+        count, size = 0, 0
+        try:
+            with os.scandir(self.path) as entries:
+                for entry in entries:
+                    count += 1
+                    size += entry.stat().st_size
+        except FileNotFoundError:
+            pass
+        return (count, size)
+
+
+def process_start(pid: int):
+    # Start time of a process in clock ticks since boot, None if unknown
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as f:
+            # The fields after the command, which may contain spaces
+            fields = f.read().rsplit(')', 1)[1].split()
+        return int(fields[19])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def process_tag():
+    # "<pid>-<start time>" of this process
+    pid = os.getpid()
+    return f"{pid}-{process_start(pid) or 0}"
+
+
+def owner_alive(stem: str):
+    # Whether the process named in a segment name is still running; segments
+    # named by the PID only, or without a known start time, go by the PID
+    fields = stem.split('-')
+    pid = int(fields[1])
+    if not pid_alive(pid):
+        return False
+    start = int(fields[2]) if len(fields) > 2 else 0
+    return not start or process_start(pid) in (None, start)
+
+
+def pid_alive(pid: int):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
@@ -144,6 +144,232 @@ def generate_metric_table_sqls(table_schemas: dict,
     return sql_statements
 
 
+def generate_compression_sqls(table_name: str, compress_after: int):
+    # Columnar compression of a metric hypertable: one segment per node, and
+    # per fqdd in idrac tables, ordered by time; chunks are compressed once
+    # they are `compress_after` days old
+    segment_by = 'nodeid, fqdd' if table_name.startswith('idrac.') else 'nodeid'
+    settings_sql = f"ALTER TABLE {table_name} SET (timescaledb.compress, \
+            timescaledb.compress_segmentby = '{segment_by}', \
+            timescaledb.compress_orderby = 'timestamp DESC');"
+    policy_sql = f"SELECT add_compression_policy('{table_name}', \
+            INTERVAL '{int(compress_after)} days', if_not_exists => TRUE);"
+    return [settings_sql, policy_sql]
+
+
+def chunk_interval(bytes_per_second: float, chunk_config: dict):
+    # Seconds of data that fill a chunk of the target size, within the bounds
+    if bytes_per_second <= 0:
+        return int(chunk_config['max_interval'])
+    seconds = chunk_config['target_size'] / bytes_per_second
+    return int(min(chunk_config['max_interval'], max(chunk_config['min_interval'], seconds)))
+
+
+def estimate_chunk_interval(sensing_interval: float, nodes: int, series: int, chunk_config: dict):
+    # Chunk interval of a table written `series` rows per node every
+    # `sensing_interval` seconds, before there is data to measure
+    bytes_per_second = nodes * series * chunk_config['row_size'] / sensing_interval
+    return chunk_interval(bytes_per_second, chunk_config)
+
+
+def generate_hypertable_sql(table_name: str, chunk_seconds: int):
+    return f"SELECT create_hypertable('{table_name}', 'timestamp', \
+            chunk_time_interval => INTERVAL '{int(chunk_seconds)} seconds', if_not_exists => TRUE);"
+
+
+def get_index_columns(table_name: str):
+    # Indexes of the MetricsBuilder query paths, besides the default one on
+    # timestamp: metric rows by node and time (and fqdd in idrac tables), and
+    # jobs by the time range they ran in
+    if table_name == 'slurm.jobs':
+        return [['start_time', 'end_time']]
+    if table_name.startswith('idrac.'):
+        return [['nodeid', 'timestamp DESC'], ['fqdd', 'nodeid', 'timestamp']]
+    return [['nodeid', 'timestamp DESC']]
+
+
+def get_index_name(table_name: str, columns: list):
+    # e.g. rpmreading_nodeid_timestamp_idx, in the schema of the table
+    column_names = '_'.join(column.split(' ')[0] for column in columns)
+    return f"{table_name.split('.')[-1].lower()}_{column_names}_idx"
+
+
+def generate_index_sqls(table_name: str):
+    return [f"CREATE INDEX IF NOT EXISTS {get_index_name(table_name, columns)} \
+            ON {table_name} ({', '.join(columns)});" for columns in get_index_columns(table_name)]
+
+
+def relation_exists(conn: object, relation: str):
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (relation,))
+        return cur.fetchone()[0]
+
+
+def create_indexes(conn: object, table_name: str):
+    with conn.cursor() as cur:
+        for statement in generate_index_sqls(table_name):
+            cur.execute(statement)
+
+
+def get_chunk_intervals(conn: object, schemas: list):
+    # Current chunk interval (seconds) of the hypertables of the schemas
+    with conn.cursor() as cur:
+        cur.execute("SELECT hypertable_schema || '.' || hypertable_name, \
+                     extract(epoch FROM time_interval) \
+                     FROM timescaledb_information.dimensions \
+                     WHERE hypertable_schema = ANY(%s) AND column_name = 'timestamp';", (list(schemas),))
+        return {table_name: float(seconds) for table_name, seconds in cur.fetchall()}
+
+
+def get_ingest_rate(conn: object, hypertable: str, chunks: int = 3):
+    # Bytes per second written to a hypertable, measured on its latest
+    # `chunks` closed and uncompressed chunks; None without such chunks
+    schema_name, table_name = hypertable.split('.', 1)
+    with conn.cursor() as cur:
+        cur.execute("SELECT sum(size.total_bytes), \
+                     sum(extract(epoch FROM chunk.range_end - chunk.range_start)) \
+                     FROM (SELECT chunk_schema, chunk_name, range_start, range_end \
+                           FROM timescaledb_information.chunks \
+                           WHERE hypertable_schema = %s AND hypertable_name = %s \
+                           AND NOT is_compressed AND range_end <= now() \
+                           ORDER BY range_end DESC LIMIT %s) AS chunk \
+                     JOIN chunks_detailed_size(%s::regclass) AS size \
+                     ON size.chunk_schema = chunk.chunk_schema AND size.chunk_name = chunk.chunk_name;",
+                    (schema_name, table_name, chunks, hypertable))
+        total_bytes, seconds = cur.fetchone()
+    if not total_bytes or not seconds:
+        return None
+    return float(total_bytes) / float(seconds)
+
+
+def set_chunk_interval(conn: object, table_name: str, chunk_seconds: int):
+    # Applies to the chunks created from now on
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT set_chunk_time_interval('{table_name}', INTERVAL '{int(chunk_seconds)} seconds');")
+
+
+def get_hypertables(conn: object, schemas: list):
+    # Hypertables of the schemas and whether they have compression settings
+    with conn.cursor() as cur:
+        cur.execute("SELECT hypertable_schema || '.' || hypertable_name, compression_enabled \
+                     FROM timescaledb_information.hypertables \
+                     WHERE hypertable_schema = ANY(%s) ORDER BY 1;", (list(schemas),))
+        return dict(cur.fetchall())
+
+
+def enable_compression(conn: object, table_name: str, compress_after: int):
+    # The settings cannot change once chunks are compressed; tables that have
+    # them already only get the policy. Return whether the settings were added.
+    if not compress_after:
+        return False
+    settings_sql, policy_sql = generate_compression_sqls(table_name, compress_after)
+    # Unquoted names are stored in lower case
+    enabled = get_hypertables(conn, [table_name.split('.')[0]]).get(table_name.lower(), False)
+    with conn.cursor() as cur:
+        if not enabled:
+            cur.execute(settings_sql)
+        cur.execute(policy_sql)
+    return not enabled
+
+
+def generate_aggregate_sqls(table_name: str, bucket: str, refresh_window: int):
+    # Continuous aggregate of a numeric metric table per node (and fqdd in
+    # idrac tables) in buckets of `bucket`, e.g. idrac.rpmreading_agg_5m.
+    # Recent buckets not materialized yet are computed from the raw table.
+    width, schedule = utils.aggregate_buckets[bucket]
+    group_by = 'nodeid, fqdd' if table_name.startswith('idrac.') else 'nodeid'
+    view_name = f"{table_name}_agg_{bucket}"
+    view_sql = f"CREATE MATERIALIZED VIEW IF NOT EXISTS {view_name} \
+            WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS \
+            SELECT time_bucket(INTERVAL '{width}', timestamp) AS timestamp, {group_by}, \
+            min(value) AS min, max(value) AS max, sum(value) AS sum, count(value) AS count \
+            FROM {table_name} GROUP BY 1, {group_by} WITH NO DATA;"
+    policy_sql = f"SELECT add_continuous_aggregate_policy('{view_name}', \
+            start_offset => INTERVAL '{int(refresh_window)} hours', end_offset => INTERVAL '{width}', \
+            schedule_interval => INTERVAL '{schedule}', if_not_exists => TRUE);"
+    return [view_sql, policy_sql]
+
+
+def create_aggregates(conn: object, table_name: str, aggregate_config: dict):
+    with conn.cursor() as cur:
+        for bucket in aggregate_config['buckets']:
+            for statement in generate_aggregate_sqls(table_name, bucket, aggregate_config['refresh_window']):
+                cur.execute(statement)
+
+
+def generate_aggregate_refresh_sql(table_name: str, bucket: str):
+    # Materialize the whole history of a continuous aggregate up to where its
+    # refresh policy takes over; views are created WITH NO DATA
+    width = utils.aggregate_buckets[bucket][0]
+    return f"CALL refresh_continuous_aggregate('{table_name}_agg_{bucket}', NULL, \
+            now() - INTERVAL '{width}');"
+
+
+def refresh_aggregates(conn: object, table_name: str, aggregate_config: dict):
+    # refresh_continuous_aggregate cannot run inside a transaction, and each
+    # refresh is committed on its own
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            for bucket in aggregate_config['buckets']:
+                cur.execute(generate_aggregate_refresh_sql(table_name, bucket))
+    finally:
+        conn.autocommit = autocommit
+
+
+def get_value_types(conn: object, schemas: list):
+    # Type of the value column of the tables of the schemas
+    with conn.cursor() as cur:
+        cur.execute("SELECT table_schema || '.' || table_name, data_type \
+                     FROM information_schema.columns \
+                     WHERE table_schema = ANY(%s) AND column_name = 'value';", (list(schemas),))
+        return dict(cur.fetchall())
+
+
+def generate_retention_sqls(relation: str, drop_after: int):
+    # Replace the retention policy of a hypertable or continuous aggregate;
+    # none if `drop_after` is 0
+    sqls = [f"SELECT remove_retention_policy('{relation}', if_exists => TRUE);"]
+    if drop_after:
+        sqls.append(f"SELECT add_retention_policy('{relation}', INTERVAL '{int(drop_after)} days');")
+    return sqls
+
+
+def set_retention(conn: object, relation: str, drop_after: int):
+    with conn.cursor() as cur:
+        for statement in generate_retention_sqls(relation, drop_after):
+            cur.execute(statement)
+
+
+def drop_expired_chunks(conn: object, relation: str, drop_after: int):
+    # Drop the chunks older than the retention now, return their names
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT drop_chunks('{relation}', older_than => INTERVAL '{int(drop_after)} days');")
+        return [row[0] for row in cur.fetchall()]
+
+
+def get_continuous_aggregates(conn: object, schemas: list):
+    # Continuous aggregates of the schemas and their materialization hypertables
+    with conn.cursor() as cur:
+        cur.execute("SELECT view_schema || '.' || view_name, \
+                     materialization_hypertable_schema || '.' || materialization_hypertable_name \
+                     FROM timescaledb_information.continuous_aggregates \
+                     WHERE view_schema = ANY(%s) ORDER BY 1;", (list(schemas),))
+        return dict(cur.fetchall())
+
+
+def get_storage(conn: object, hypertable: str):
+    # Number of chunks and bytes (with indexes and TOAST) of a hypertable
+    schema_name, table_name = hypertable.split('.', 1)
+    with conn.cursor() as cur:
+        cur.execute("SELECT count(*) FROM timescaledb_information.chunks \
+                     WHERE hypertable_schema = %s AND hypertable_name = %s;", (schema_name, table_name))
+        chunks = cur.fetchone()[0]
+        cur.execute("SELECT coalesce(hypertable_size(%s::regclass), 0);", (hypertable,))
+        return chunks, cur.fetchone()[0]
+
+
 def generate_slurm_job_table_sql(schema_name: str):
     sql_statements = {}
     table = 'jobs'
@@ -0,0 +1,69 @@
+import orjson
+
+# orjson decodes bytes and memoryviews directly, without an intermediate str
+loads = orjson.loads
+
+# Largest event kept in the receive buffer; a stream that sends more without
+# a blank line between events is broken
+MAX_EVENT_SIZE = 4 * 1024 * 1024
+
+
+def find_event_end(buf: bytearray, start: int):
+    # Return (end of the event, length of the separator), or (-1, 0)
+    lf = buf.find(b'\n\n', start)
+    crlf = buf.find(b'\r\n\r\n', start)
+    if crlf >= 0 and (lf < 0 or crlf < lf):
+        return (crlf, 4)
+    if lf >= 0:
+        return (lf, 2)
+    return (-1, 0)
+
+
+def data_spans(buf: bytearray, end: int):
+    # Offsets of the values of the `data` fields of the event in buf[:end]
+    spans = []
+    pos = 0
+    while pos < end:
+        line_end = buf.find(b'\n', pos, end)
+        if line_end < 0:
+            line_end = end
+        stop = line_end - 1 if line_end > pos and buf[line_end - 1] == 0x0D else line_end
+        if buf.startswith(b'data:', pos, stop):
+            value = pos + 5
+            if value < stop and buf[value] == 0x20:
+                value += 1
+            spans.append((value, stop))
+        pos = line_end + 1
+    return spans
+
+
+async def iter_sse_data(content: object):
+    """
+    Yield the data of each Server-Sent Event of an aiohttp response stream.
+    The data is a memoryview into the receive buffer and is only valid until
+    the next event is requested. Raise ValueError if an event grows past
+    MAX_EVENT_SIZE, so the stream is reconnected.
+    """
+    buf = bytearray()
+    async for chunk in content.iter_any():
+        # The separator may straddle the previous chunk
+        scan = max(0, len(buf) - 3)
+        buf += chunk
+        while True:
+            end, sep = find_event_end(buf, scan)
+            if end < 0:
+                break
+            spans = data_spans(buf, end)
+            if len(spans) == 1:
+                view = memoryview(buf)
+                data = view[spans[0][0]:spans[0][1]]
+                yield data
+                data.release()
+                view.release()
+            elif spans:
+                # Multi-line data are joined by newlines
+                yield b'\n'.join(bytes(buf[a:b]) for a, b in spans)
+            del buf[:end + sep]
+            scan = 0
+        if len(buf) > MAX_EVENT_SIZE:
+            raise ValueError(f"No end of event in {len(buf)} bytes of the stream")
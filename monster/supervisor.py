@@ -0,0 +1,105 @@
+import time
+import random
+import asyncio
+
+import logger
+
+log = logger.get_logger(__name__)
+
+
+class NodeState:
+    """
+    Health of the SSE stream of one node.
+    """
+    def __init__(self):
+        self.connected  = False
+        self.since      = None
+        self.last_event = None
+        self.events     = 0
+        self.reconnects = 0
+        self.failures   = 0
+        self.last_error = None
+        self.response   = None
+
+
+class Supervisor:
+    """
+    Track the SSE streams of the nodes of a worker process and pace their
+    reconnects. After a failure a node waits a random time between 0 and
+    `backoff_base * 2 ** failures` seconds, capped at `backoff_max`, so nodes
+    that drop together, e.g. on a rack power cycle, do not reconnect in
+    lockstep. A stream that stays open without delivering an event for
+    `stall_timeout` seconds is closed by the watchdog and reconnected.
+    """
+    def __init__(self, nodelist: list, backoff_base: float = 1.0, backoff_max: float = 300.0,
+                 stall_timeout: float = 300.0, startup_spread: float = 30.0,
+                 report_interval: float = 60.0):
+        self.backoff_base    = backoff_base
+        self.backoff_max     = backoff_max
+        self.stall_timeout   = stall_timeout
+        self.startup_spread  = startup_spread
+        self.report_interval = report_interval
+
+        self.states = {node: NodeState() for node in nodelist}
+
+    def startup_delay(self):
+        # Spread the first connections of all nodes
+        return random.uniform(0, self.startup_spread)
+
+    def connected(self, node: str, response: object):
+        state = self.states[node]
+        state.connected  = True
+        state.since      = time.monotonic()
+        state.last_event = state.since
+        state.response   = response
+
+    def event(self, node: str):
+        state = self.states[node]
+        state.last_event = time.monotonic()
+        state.events += 1
+        # Only a stream that delivers events counts as recovered
+        state.failures = 0
+
+    def disconnected(self, node: str, err: object):
+        # Return the seconds to wait before reconnecting
+        state = self.states[node]
+        state.connected  = False
+        state.response   = None
+        state.last_error = str(err)
+        state.reconnects += 1
+        state.failures   += 1
+        ceiling = min(self.backoff_max, self.backoff_base * 2 ** min(state.failures, 32))
+        return random.uniform(0, ceiling)
+
+    async def watchdog(self):
+        # Close stalled streams and log a health summary now and then
+        last_report = time.monotonic()
+        while True:
+            await asyncio.sleep(min(self.stall_timeout / 4, self.report_interval))
+            now = time.monotonic()
+            for node, state in self.states.items():
+                if state.connected and state.response is not None \
+                   and now - state.last_event >= self.stall_timeout:
+                    log.warning(f"No events from {node} for {now - state.last_event:.0f} s, reconnecting")
+                    # Ends the iteration over the stream in the listener
+                    state.response.close()
+                    state.response = None
+            if now - last_report >= self.report_interval:
+                self.report()
+                last_report = now
+
+    def event_ages(self):
+        # Seconds since the last event of each connected stream
+        now = time.monotonic()
+        return {(node,): now - state.last_event for node, state in self.states.items() if state.connected}
+
+    def report(self):
+        now = time.monotonic()
+        connected = [state for state in self.states.values() if state.connected]
+        down = [node for node, state in self.states.items() if not state.connected]
+        ages = [now - state.last_event for state in connected]
+        reconnects = sum(state.reconnects for state in self.states.values())
+        log.info(f"{len(connected)}/{len(self.states)} streams connected, "
+                 f"max event age {max(ages, default=0):.0f} s, {reconnects} reconnects in total")
+        if down:
+            log.info(f"Streams down: {', '.join(down)}")
@@ -1,10 +1,13 @@
 import os
+import re
 import argparse
+from datetime import datetime
 from pathlib import Path
 
 import hostlist
 import psycopg2
 import yaml
+from dateutil.parser import parse
 
 from monster import logger
 
@@ -19,6 +22,24 @@ data_type_mapping = {
 }
 
 
+# Buckets of the continuous aggregates of the metric tables: the bucket width
+# and how often the aggregate is refreshed
+aggregate_buckets = {
+    '1m': ('1 minute', '5 minutes'),
+    '5m': ('5 minutes', '15 minutes'),
+    '1h': ('1 hour', '1 hour'),
+}
+
+# Schemas of the metric hypertables
+metric_schemas = ['idrac', 'slurm', 'irc', 'pdu']
+
+# Seconds between the polls of the pull collectors
+poll_intervals = {'idrac': 60, 'slurm': 60, 'pdu': 60, 'irc': 120}
+
+# Column types (in information_schema) whose values can be aggregated
+numeric_types = ('smallint', 'integer', 'bigint', 'real', 'double precision', 'numeric')
+
+
 class bcolors:
     HEADER = '\033[95m'
     OKBLUE = '\033[94m'
@@ -120,6 +141,79 @@ def init_tsdb_connection(config):
     return f"postgresql://{db_user}:{db_pswd}@{db_host}:{db_port}/{db_dbnm}"
 
 
+def get_compression_config(config):
+    # Age (days) after which chunks of the metric hypertables are compressed,
+    # 0 to leave them uncompressed
+    compression = config['timescaledb'].get('compression', None) or {}
+    return {
+        'compress_after': int(compression.get('compress_after', 7)),
+    }
+
+
+def get_aggregate_config(config):
+    # Buckets of the continuous aggregates of the numeric metric tables, an
+    # empty list for none; the aggregates are refreshed over the last
+    # `refresh_window` hours, at least 3 so it spans two hourly buckets
+    aggregates = config['timescaledb'].get('aggregates', None) or {}
+    buckets = aggregates.get('buckets', list(aggregate_buckets))
+    unknown = [bucket for bucket in buckets if bucket not in aggregate_buckets]
+    if unknown:
+        log.error(f"Unknown aggregate buckets {unknown}, use {list(aggregate_buckets)}")
+        raise SystemExit(1)
+    return {
+        'buckets': buckets,
+        'refresh_window': max(3, int(aggregates.get('refresh_window', 24))),
+    }
+
+
+def get_chunk_config(config):
+    # Target size (MiB) of a chunk of a metric hypertable with its indexes,
+    # estimated bytes per row and series (fqdds) per node of an iDRAC metric
+    # until the tables have data, and the bounds (hours) of the chunk interval
+    chunks = config['timescaledb'].get('chunks', None) or {}
+    return {
+        'target_size': int(chunks.get('target_size', 256)) * 1024 * 1024,
+        'row_size': int(chunks.get('row_size', 100)),
+        'series_per_node': int(chunks.get('series_per_node', 8)),
+        'min_interval': float(chunks.get('min_interval', 1)) * 3600,
+        'max_interval': float(chunks.get('max_interval', 168)) * 3600,
+    }
+
+
+def parse_duration(duration: str):
+    # Seconds of an ISO 8601 duration such as 'PT5S' (a Redfish
+    # SensingInterval), None if it cannot be parsed
+    match = re.fullmatch(r'P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+(?:\.\d+)?)S)?)?', duration or '')
+    if not match or not any(match.groups()):
+        return None
+    days, hours, minutes, seconds = (float(group or 0) for group in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+def get_retention_config(config):
+    # Age (days) after which the raw rows of each schema and the rows of the
+    # continuous aggregates of each bucket are dropped, 0 to keep them
+    retention = config['timescaledb'].get('retention', None) or {}
+    raw = {schema: int(days or 0) for schema, days in (retention.get('raw', None) or {}).items()}
+    aggregates = {bucket: int(days or 0) for bucket, days in (retention.get('aggregates', None) or {}).items()}
+    unknown = [schema for schema in raw if schema not in metric_schemas] \
+        + [bucket for bucket in aggregates if bucket not in aggregate_buckets]
+    if unknown:
+        log.error(f"Unknown retention tiers {unknown}, use {metric_schemas} and {list(aggregate_buckets)}")
+        raise SystemExit(1)
+    # Refreshing an aggregate over dropped raw chunks would erase its buckets
+    refresh_window = get_aggregate_config(config)['refresh_window']
+    short = [schema for schema, days in raw.items() if days and days * 24 <= refresh_window]
+    if short:
+        log.error(f"Raw retention of {short} must be longer than the aggregates' "
+                  f"refresh window of {refresh_window} hours")
+        raise SystemExit(1)
+    return {
+        'raw': raw,
+        'aggregates': aggregates,
+    }
+
+
 def get_partition(config):
     partition = config['partition']
     return partition
@@ -223,6 +317,12 @@ def get_idrac_api(config):
             raise SystemExit(1)
 
 
+def get_idrac_extract_specs(config):
+    # Pull model only: how metrics are read from the Redfish resources, on
+    # top of the defaults of extract.DEFAULT_SPECS
+    return config['idrac'].get('extract', None) or {}
+
+
 def get_idrac_model(config):
     return config['idrac']['model']
 
@@ -236,6 +336,111 @@ def get_idrac_metrics(config):
         return []
 
 
+def get_idrac_batch_config(config):
+    # Thresholds of the push-mode batch writer; a batch is flushed once either is hit.
+    # Batches are written by `writers` threads, each with its own connection, or,
+    # if `writer_processes` is set, by that many processes fed through ring
+    # buffers of `ring_size` MiB.
+    batch = config['idrac'].get('batch', {})
+    return {
+        'max_rows': int(batch.get('max_rows', 50000)),
+        'max_delay': float(batch.get('max_delay', 5)),
+        'writers': int(batch.get('writers', 2)),
+        'writer_processes': int(batch.get('writer_processes', 0)),
+        'ring_size': int(batch.get('ring_size', 64)) * 1024 * 1024,
+        'queue_size': int(batch.get('queue_size', 1000)),
+        'report_interval': float(batch.get('report_interval', 60)),
+    }
+
+
+def get_idrac_spool_config(config):
+    # Push-mode spool for batches the database cannot take; disabled if `path` is empty
+    spool = config['idrac'].get('spool', {})
+    path = spool.get('path', 'spool')
+    if not path:
+        return None
+    return {
+        'path': str(Path(__file__).resolve().parent.parent / path),
+        'segment_size': int(spool.get('segment_size', 64)) * 1024 * 1024,
+        'max_age': float(spool.get('max_age', 10)),
+        'replay_interval': float(spool.get('replay_interval', 5)),
+    }
+
+
+def get_idrac_stream_config(config):
+    # Push-mode SSE streams: reconnect backoff bounds, stall detection, health
+    # reports and the read buffer size (KiB) of each stream
+    stream = config['idrac'].get('stream', {})
+    return {
+        'read_bufsize': int(stream.get('read_bufsize', 64)) * 1024,
+        'backoff_base': float(stream.get('backoff_base', 1)),
+        'backoff_max': float(stream.get('backoff_max', 300)),
+        'stall_timeout': float(stream.get('stall_timeout', 300)),
+        'startup_spread': float(stream.get('startup_spread', 30)),
+        'report_interval': float(stream.get('report_interval', 60)),
+    }
+
+
+def get_idrac_fetch_config(config):
+    # Pull-mode request concurrency: bounds of the adaptive total limit, the
+    # limit per BMC and the latency (s) above which the total limit shrinks.
+    # Circuit breaker: failures after which a BMC is skipped, and the first
+    # and longest wait (s) between probes. Whether to request only the
+    # metrics with $select where the iDRAC supports it.
+    fetch = config['idrac'].get('fetch', {})
+    return {
+        'initial': int(fetch.get('initial', 32)),
+        'minimum': int(fetch.get('minimum', 4)),
+        'maximum': int(fetch.get('maximum', 256)),
+        'per_host': int(fetch.get('per_host', 2)),
+        'latency_target': float(fetch.get('latency_target', 2)),
+        'failure_threshold': int(fetch.get('failure_threshold', 3)),
+        'probe_interval': float(fetch.get('probe_interval', 60)),
+        'max_probe_interval': float(fetch.get('max_probe_interval', 900)),
+        'select': bool(fetch.get('select', True)),
+    }
+
+
+def get_idrac_deadband_config(config):
+    # Deadband (in the units of the metric) by metric name, the deadband of the
+    # other metrics (none if not set) and the longest gap (s) between writes
+    deadband = config['idrac'].get('deadband', None) or {}
+    default  = deadband.get('default', None)
+    return {
+        'metrics': {metric: float(band) for metric, band in (deadband.get('metrics', None) or {}).items()},
+        'default': None if default is None else float(default),
+        'heartbeat': float(deadband.get('heartbeat', 600)),
+    }
+
+
+def get_scheduling_config(config):
+    # Pull collectors spread their polls over the first `spread` of each
+    # interval, and shed what is not done `deadline` of the interval after
+    # the tick; polls that start after the deadline would always be shed
+    scheduling = config.get('scheduling', {}) or {}
+    spread   = min(max(float(scheduling.get('spread', 0.5)), 0.0), 0.9)
+    deadline = min(max(float(scheduling.get('deadline', 0.9)), 0.1), 1.0)
+    if spread >= deadline:
+        log.error(f"scheduling.spread ({spread}) must be less than scheduling.deadline ({deadline})")
+        raise SystemExit(1)
+    return {
+        'spread': spread,
+        'deadline': deadline,
+    }
+
+
+def get_exporter_config(config, collector: str):
+    # Self-metrics endpoint of a collector; disabled if it has no port
+    exporter = config.get('exporter', {}) or {}
+    port = int(exporter.get('ports', {}).get(collector, 0) or 0)
+    if not port:
+        return None
+    return {
+        'host': exporter.get('host', '127.0.0.1'),
+        'port': port,
+    }
+
+
 def get_nodeid_map(conn: object):
     mapping = {}
     cur = conn.cursor()
@@ -346,6 +551,24 @@ def cast_value_type(value, dtype):
         return value
 
 
+def parse_redfish_timestamp(timestamp: str):
+    """
+    Parse a Redfish timestamp truncated to seconds, e.g. 2024-06-15T12:00:05-05:00,
+    2024-06-15T12:00:05.123+00:00 or 2024-06-15T12:00:05Z. Anything else falls
+    back to dateutil.
+    """
+    try:
+        offset = timestamp[19:]
+        if offset[:1] == '.':
+            # Drop the fractional seconds
+            offset = offset.lstrip('.0123456789')
+        if offset == 'Z':
+            offset = '+00:00'
+        return datetime.fromisoformat(timestamp[:19] + offset)
+    except ValueError:
+        return parse(timestamp).replace(microsecond=0)
+
+
 def get_snmp_oids(conn: object):
     """
     Get the SNMP OIDs from the database for the given IP list.
@@ -0,0 +1,361 @@
+import io
+import time
+import asyncio
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+from pgcopy import CopyManager
+
+import exporter
+import logger
+from ringbuffer import RingBuffer
+from spool import Spool
+
+log = logger.get_logger(__name__)
+
+# Characters escaped in PostgreSQL's COPY text format
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+class BatchBuffer:
+    """
+    Buffer records per target table across all nodes until `max_rows` records
+    are buffered or the oldest buffered record is `max_delay` seconds old.
+    """
+    def __init__(self, max_rows: int = 50000, max_delay: float = 5.0):
+        self.max_rows  = max_rows
+        self.max_delay = max_delay
+
+        self.buffers = {}
+        self.rows    = 0
+        self.oldest  = None
+
+    def add(self, table: str, records: list, rows: int = None):
+        # `rows` is given when the records are pre-encoded chunks of rows
+        if not records:
+            return
+        if table not in self.buffers:
+            self.buffers[table] = []
+        self.buffers[table].extend(records)
+        self.rows += len(records) if rows is None else rows
+        if self.oldest is None:
+            self.oldest = time.monotonic()
+
+    def time_left(self):
+        # Seconds until the time threshold is hit, None if nothing is buffered
+        if self.oldest is None:
+            return None
+        return max(0.0, self.oldest + self.max_delay - time.monotonic())
+
+    def due(self):
+        return self.rows >= self.max_rows or self.time_left() == 0.0
+
+    def take(self):
+        batch, rows = self.buffers, self.rows
+        self.buffers = {}
+        self.rows    = 0
+        self.oldest  = None
+        return (batch, rows)
+
+
+class WriterPool:
+    """
+    Write batches on `workers` threads, each holding its own database
+    connection, so COPYs overlap with the socket reads on the event loop.
+    At most `workers` batches are queued behind the ones being written.
+    Beyond that, and for batches that fail to write, batches go to the spool
+    if one is given; otherwise `submit` waits for a free slot.
+    """
+    def __init__(self, connection: str, cols: tuple, workers: int = 2,
+                 report_interval: float = 60.0, spool: Spool = None):
+        self.connection      = connection
+        self.cols            = cols
+        self.report_interval = report_interval
+        self.spool           = spool
+
+        self.executor    = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='writer')
+        self.slots       = asyncio.Semaphore(workers * 2)
+        self.local       = threading.local()
+        self.conns       = []
+        self.lock        = threading.Lock()
+        self.stats       = new_flush_stats()
+        self.last_report = time.monotonic()
+
+    async def submit(self, batch: dict, rows: int):
+        if not rows:
+            return
+        loop = asyncio.get_running_loop()
+        if self.spool and self.slots.locked():
+            # The database does not keep up, spill the batch to disk
+            await loop.run_in_executor(None, self.spill, batch, rows)
+            return
+        await self.slots.acquire()
+        future = loop.run_in_executor(self.executor, self.write, batch, rows)
+        future.add_done_callback(lambda _: self.slots.release())
+
+    def write(self, batch: dict, rows: int):
+        start = time.perf_counter()
+        try:
+            conn, managers = self.get_connection()
+            copy_batch(conn, managers, self.cols, batch)
+            ok = True
+        except Exception as err:
+            self.reset_connection()
+            log.error(f"Cannot write batch of {rows} records to {len(batch)} tables: {err}")
+            ok = False
+            if self.spool:
+                self.spill(batch, rows)
+        self.record(rows, time.perf_counter() - start, ok)
+
+    def spill(self, batch: dict, rows: int):
+        try:
+            self.spool.append([encode_message(table, records) for table, records in batch.items()])
+            exporter.SPOOLED.inc((), rows)
+            log.info(f"Spooled batch of {rows} records")
+        except Exception as err:
+            log.error(f"Cannot spool batch of {rows} records: {err}")
+
+    def get_connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or conn.closed:
+            conn = psycopg2.connect(self.connection)
+            self.local.conn     = conn
+            self.local.managers = {}
+            with self.lock:
+                self.conns.append(conn)
+        return (conn, self.local.managers)
+
+    def reset_connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            return
+        try:
+            conn.rollback()
+        except Exception:
+            # The connection is broken, reconnect on the next batch
+            conn.close()
+
+    def record(self, rows: int, latency: float, ok: bool):
+        with self.lock:
+            record_flush(self.stats, rows, latency, ok)
+            if time.monotonic() - self.last_report >= self.report_interval:
+                report_flush_stats(self.stats)
+                self.stats       = new_flush_stats()
+                self.last_report = time.monotonic()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for conn in self.conns:
+            conn.close()
+
+
+def rollback(conn: object):
+    # Abort the failed transaction; close a broken connection so the next
+    # batch reconnects
+    if conn is None or conn.closed:
+        return
+    try:
+        conn.rollback()
+    except Exception:
+        conn.close()
+
+
+def copy_batch(conn: object, managers: dict, cols: tuple, batch: dict):
+    # Write all tables of the batch in one transaction
+    for table, records in batch.items():
+        # CopyManager looks up the column types on creation, reuse it
+        if table not in managers:
+            managers[table] = CopyManager(conn, table, cols)
+        managers[table].copy(records)
+    conn.commit()
+    for table, records in batch.items():
+        exporter.RECORDS.inc((table,), len(records))
+
+
+def copy_encoded_batch(conn: object, cols: tuple, batch: dict):
+    # Write all tables of the batch of COPY text chunks in one transaction
+    columns = ', '.join(cols)
+    with conn.cursor() as cur:
+        for table, chunks in batch.items():
+            cur.copy_expert(f"COPY {table} ({columns}) FROM STDIN", io.BytesIO(b''.join(chunks)))
+    conn.commit()
+    for table, chunks in batch.items():
+        # Newlines are escaped inside values, so each one ends a row
+        exporter.RECORDS.inc((table,), sum(chunk.count(b'\n') for chunk in chunks))
+
+
+def encode_copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, str):
+        return value.translate(COPY_ESCAPES)
+    return str(value)
+
+
+def encode_copy_rows(records: list):
+    lines = ['\t'.join([encode_copy_value(v) for v in record]) for record in records]
+    lines.append('')
+    return '\n'.join(lines).encode('utf-8')
+
+
+def encode_message(table: str, records: list):
+    # Ring and spool message: "<table>\t<rows>\n" followed by the rows in COPY text format
+    return f"{table}\t{len(records)}\n".encode('utf-8') + encode_copy_rows(records)
+
+
+def encode_chunks_message(table: str, chunks: list):
+    # Newlines are escaped inside values, so each one ends a row
+    payload = b''.join(chunks)
+    rows = payload.count(b'\n')
+    return f"{table}\t{rows}\n".encode('utf-8') + payload
+
+
+def decode_message(message: bytes):
+    end = message.index(b'\n')
+    table, rows = message[:end].decode('utf-8').split('\t')
+    return (table, int(rows), message[end + 1:])
+
+
+def run_ring_writer(connection: str, ring_names: list, cols: tuple, max_rows: int,
+                    max_delay: float, report_interval: float, spool_config: dict = None,
+                    exporter_config: dict = None, offset: int = 0):
+    """
+    Writer process of the push pipeline: drain already-encoded rows from the
+    ring buffers of the listener processes and COPY them in batches over a
+    single connection. Batches that fail to write go to the spool.
+    """
+    exporter.start(exporter_config, offset)
+    spool = start_spool(connection, cols, spool_config)
+    rings       = [RingBuffer.attach(name) for name in ring_names]
+    buffer      = BatchBuffer(max_rows, max_delay)
+    conn        = None
+    stats       = new_flush_stats()
+    last_report = time.monotonic()
+
+    while True:
+        idle = True
+        for ring in rings:
+            # Take a bounded number of messages from each ring to stay fair
+            for _ in range(1024):
+                message = ring.get()
+                if message is None:
+                    break
+                idle = False
+                table, rows, payload = decode_message(message)
+                buffer.add(table, [payload], rows)
+
+        if buffer.rows and buffer.due():
+            batch, rows = buffer.take()
+            start = time.perf_counter()
+            try:
+                if conn is None or conn.closed:
+                    conn = psycopg2.connect(connection)
+                copy_encoded_batch(conn, cols, batch)
+                ok = True
+            except Exception as err:
+                rollback(conn)
+                log.error(f"Cannot write batch of {rows} records to {len(batch)} tables: {err}")
+                ok = False
+                if spool:
+                    try:
+                        spool.append([encode_chunks_message(table, chunks) for table, chunks in batch.items()])
+                        exporter.SPOOLED.inc((), rows)
+                    except Exception as err:
+                        log.error(f"Cannot spool batch of {rows} records, dropping it: {err}")
+            record_flush(stats, rows, time.perf_counter() - start, ok)
+            if time.monotonic() - last_report >= report_interval:
+                report_flush_stats(stats)
+                stats       = new_flush_stats()
+                last_report = time.monotonic()
+        elif idle:
+            time.sleep(0.01)
+
+
+def start_spool(connection: str, cols: tuple, spool_config: dict):
+    # Create the spool of this process and the thread replaying it
+    if not spool_config:
+        return None
+    spool = Spool(spool_config['path'], spool_config['segment_size'], spool_config['max_age'])
+    replayer = threading.Thread(target=replay_spool,
+                                args=(spool, connection, cols, spool_config['replay_interval']),
+                                name='replayer', daemon=True)
+    replayer.start()
+    return spool
+
+
+def replay_spool(spool: Spool, connection: str, cols: tuple, interval: float):
+    """
+    Drain the spool once the database accepts writes again. Each segment is
+    written in a single transaction and removed afterwards, so a failed
+    replay is retried as a whole.
+    """
+    conn = None
+    while True:
+        time.sleep(interval)
+        try:
+            conn = replay_segments(spool, conn, connection, cols, interval)
+        except Exception as err:
+            # Keep the thread alive, the segments are claimed again next time
+            log.error(f"Cannot replay the spool, retry in {interval} s: {err}")
+
+
+def replay_segments(spool: Spool, conn: object, connection: str, cols: tuple, interval: float):
+    # Replay the claimed segments until one fails; return the connection
+    spool.rotate()
+    segments = spool.claim()
+    for i, segment in enumerate(segments):
+        batch = {}
+        rows  = 0
+        start = time.perf_counter()
+        try:
+            for message in spool.read(segment):
+                table, count, payload = decode_message(message)
+                if table not in batch:
+                    batch[table] = []
+                batch[table].append(payload)
+                rows += count
+            if conn is None or conn.closed:
+                conn = psycopg2.connect(connection)
+            copy_encoded_batch(conn, cols, batch)
+            spool.release(segment, done=True)
+            log.info(f"Replayed {rows} spooled records in {time.perf_counter() - start:.1f} s")
+        except Exception as err:
+            rollback(conn)
+            # Hand back this segment and the rest of the claimed ones
+            for claimed in segments[i:]:
+                spool.release(claimed, done=False)
+            log.error(f"Cannot replay spooled records, retry in {interval} s: {err}")
+            break
+    return conn
+
+
+def new_flush_stats():
+    return {'flushes': 0, 'failures': 0, 'rows': 0, 'max_rows': 0,
+            'latency': 0.0, 'max_latency': 0.0}
+
+
+def record_flush(stats: dict, rows: int, latency: float, ok: bool):
+    stats['flushes'] += 1
+    if not ok:
+        stats['failures'] += 1
+    exporter.FLUSHES.inc(('ok' if ok else 'failed',))
+    exporter.COPY_SECONDS.observe(latency)
+    stats['rows'] += rows
+    stats['max_rows'] = max(stats['max_rows'], rows)
+    stats['latency'] += latency
+    stats['max_latency'] = max(stats['max_latency'], latency)
+
+
+def report_flush_stats(stats: dict):
+    flushes = stats['flushes']
+    if not flushes:
+        return
+    log.info(f"{flushes} flushes ({stats['failures']} failed), "
+             f"{stats['rows']} rows, avg {stats['rows'] / flushes:.0f} / max {stats['max_rows']} rows per flush, "
+             f"avg {stats['latency'] / flushes * 1000:.1f} / max {stats['max_latency'] * 1000:.1f} ms per flush")
@@ -0,0 +1,62 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'monster'))
+import breaker
+import process
+from limiter import AdaptiveLimiter
+
+
+async def hang(request):
+    await asyncio.sleep(3600)
+    return web.json_response({})
+
+
+async def answer(request):
+    return web.json_response({'Fans': []})
+
+
+async def start_server(handler, port: int):
+    app = web.Application()
+    app.router.add_get('/redfish/v1/Chassis/System.Embedded.1/Thermal', handler)
+    runner = web.AppRunner(app, shutdown_timeout=0.1)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    return runner
+
+
+async def run_cycles(cycles: int):
+    hanging = await start_server(hang, 18601)
+    healthy = await start_server(answer, 18602)
+    urls = [f"http://127.0.0.1:{port}/redfish/v1/Chassis/System.Embedded.1/Thermal" for port in (18601, 18602)]
+    limiter = AdaptiveLimiter()
+    reports = []
+    try:
+        async with aiohttp.ClientSession() as session:
+            for _ in range(cycles):
+                reports.append(await process.fetch_all(urls, session=session, limiter=limiter,
+                                                       deadline=time.time() + 0.5))
+    finally:
+        await hanging.cleanup()
+        await healthy.cleanup()
+    return reports
+
+
+def test_hanging_host_opens_circuit():
+    breaker.circuits.clear()
+    breaker.configure(threshold=3, backoff=60, max_backoff=900)
+    reports = asyncio.run(run_cycles(4))
+
+    hanging = breaker.get_circuit('127.0.0.1:18601')
+    healthy = breaker.get_circuit('127.0.0.1:18602')
+    assert hanging.opened is not None
+    assert hanging.failures >= 3
+    assert healthy.opened is None and healthy.failures == 0
+    # The healthy host is answered in every cycle
+    assert all(report[1] == {'Fans': []} for report in reports)
@@ -0,0 +1,144 @@
+"""
+    Benchmark the parsing of pull-mode iDRAC reports against the node count.
+
+    Compares the previous parsing, a process pool per metric and API with the
+    maps pickled into every task, with the single pass of
+    process.process_idrac_reports_pull, serially and on a process pool. The
+    reports are synthetic Thermal and Power resources of the same shape as
+    those of an iDRAC 9.
+
+    python ./tools/bench_pull_parse.py --nodes 64 256 1024 4096
+"""
+import sys
+import time
+import argparse
+import multiprocessing
+from itertools import repeat
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'monster'))
+import extract
+import process
+from interner import Interner
+
+IDRAC_API     = ['/redfish/v1/Chassis/System.Embedded.1/Thermal',
+                 '/redfish/v1/Chassis/System.Embedded.1/Power']
+IDRAC_METRICS = ['Fans', 'Temperatures', 'PowerControl']
+PLANS         = extract.compile_plans(IDRAC_METRICS)
+
+# Fields (fqdd, source, value) of the items, as parsed before the plans
+FIELD_MAP = {'Fans': ['FanName', '@odata.type', 'Reading'],
+             'Temperatures': ['Name', '@odata.type', 'ReadingCelsius'],
+             'PowerControl': ['Name', '@odata.type', 'PowerConsumedWatts']}
+
+
+def synthetic_reports(nodelist: list, fans: int = 12, temperatures: int = 8):
+    thermal = {
+        'Fans': [{'FanName': f'System Board Fan{i}A', '@odata.type': '#Thermal.v1_4_0.Fan',
+                  'Reading': 5000 + i} for i in range(fans)],
+        'Temperatures': [{'Name': f'CPU{i} Temp', '@odata.type': '#Thermal.v1_4_0.Temperature',
+                          'ReadingCelsius': 40 + i} for i in range(temperatures)],
+    }
+    power = {
+        'PowerControl': [{'Name': 'System Power Control', '@odata.type': '#Power.v1_5_0.PowerControl',
+                          'PowerConsumedWatts': 350}],
+    }
+    # Ordered by API, then by node, like process.run_fetch_all returns them
+    return [dict(thermal) for _ in nodelist] + [dict(power) for _ in nodelist]
+
+
+def synthetic_maps(nodelist: list, reports: list):
+    nodeid_map = {node: i + 1 for i, node in enumerate(nodelist)}
+    fqdd, source = set(), set()
+    for report in reports:
+        for plan in PLANS:
+            for f_value, s_value in plan.names(report):
+                fqdd.add(f_value)
+                source.add(s_value)
+    fqdd_map   = Interner(None, 'fqdd', {name: i + 1 for i, name in enumerate(sorted(fqdd))})
+    source_map = Interner(None, 'source', {name: i + 1 for i, name in enumerate(sorted(source))})
+    return (nodeid_map, source_map, fqdd_map)
+
+
+def baseline(timestamp, nodelist: list, reports: list, nodeid_map: dict,
+             source_map: dict, fqdd_map: dict):
+    # The parsing used before: a process pool per metric and API
+    processed_records = {}
+    idrac_reports = [reports[i * len(nodelist): (i + 1) * len(nodelist)] for i in range(len(IDRAC_API))]
+    for idrac_metric in IDRAC_METRICS:
+        table_name = f"idrac.{idrac_metric.lower()}"
+        for api_reports in idrac_reports:
+            process_args = zip(repeat(timestamp), repeat(idrac_metric), nodelist, api_reports,
+                               repeat(nodeid_map), repeat(source_map), repeat(fqdd_map))
+            with multiprocessing.Pool() as pool:
+                records = pool.starmap(baseline_node, process_args)
+            records = [item for sublist in records for item in sublist]
+            processed_records.setdefault(table_name, []).extend(records)
+    return processed_records
+
+
+def baseline_node(timestamp, idrac_metric: str, node: str, report: dict,
+                  nodeid_map: dict, source_map: dict, fqdd_map: dict):
+    fqdd_field, source_field, value_field = FIELD_MAP[idrac_metric]
+    records = []
+    for item in report.get(idrac_metric, []):
+        fqdd = item.get(fqdd_field, "None").replace(" ", "_")
+        source = item.get(source_field, "None")
+        records.append((timestamp, nodeid_map[node], source_map[source], fqdd_map[fqdd],
+                        int(item.get(value_field, 0))))
+    return records
+
+
+def single_pass(timestamp, nodelist: list, reports: list, nodeid_map: dict,
+                source_map: dict, fqdd_map: dict, threshold: int):
+    process.PULL_PARALLEL_THRESHOLD = threshold
+    return process.process_all_idracs_pull(IDRAC_API, timestamp, PLANS, nodelist,
+                                           reports, nodeid_map, source_map, fqdd_map)
+
+
+def bench(func, rounds: int):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return (best, result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark pull-mode report parsing')
+    parser.add_argument('--nodes', type=int, nargs='+', default=[64, 256, 1024, 4096])
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--skip-baseline', action='store_true')
+    args = parser.parse_args()
+
+    timestamp = datetime.now(timezone.utc).replace(microsecond=0)
+    print(f"{'nodes':>6} {'reports':>8} {'baseline':>10} {'serial':>10} {'pool':>10}")
+    for count in args.nodes:
+        nodelist = [f"10.101.{i // 250}.{i % 250 + 1}" for i in range(count)]
+        reports  = synthetic_reports(nodelist)
+        nodeid_map, source_map, fqdd_map = synthetic_maps(nodelist, reports)
+
+        serial_time, serial = bench(lambda: single_pass(timestamp, nodelist, reports, nodeid_map,
+                                                        source_map, fqdd_map, float('inf')), args.rounds)
+        pool_time, pooled = bench(lambda: single_pass(timestamp, nodelist, reports, nodeid_map,
+                                                      source_map, fqdd_map, 0), args.rounds)
+        # All paths must produce the same records
+        for table_name, records in serial.items():
+            assert sorted(records) == sorted(pooled[table_name]), f"Records differ for {table_name}"
+
+        baseline_col = '-'
+        if not args.skip_baseline:
+            baseline_time, old = bench(lambda: baseline(timestamp, nodelist, reports, nodeid_map,
+                                                        source_map.mapping, fqdd_map.mapping), 1)
+            for table_name, records in serial.items():
+                assert sorted(records) == sorted(old[table_name]), f"Records differ for {table_name}"
+            baseline_col = f"{baseline_time * 1000:8.1f}ms"
+        print(f"{count:>6} {len(reports):>8} {baseline_col:>10} {serial_time * 1000:8.1f}ms {pool_time * 1000:8.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
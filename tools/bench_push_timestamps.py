@@ -0,0 +1,88 @@
+"""
+    Benchmark the timestamp handling of push-mode metric reports.
+
+    Compares the previous per-value dateutil parsing with the fast Redfish
+    path plus the per-report memo used by process.single_process_idrac_push.
+    Pass metric reports captured from an iDRAC, e.g.
+        curl -k -u user:pwd https://<idrac>/redfish/v1/TelemetryService/MetricReports/GPUMetrics > gpu.json
+    or run without arguments to use a synthetic report of the same shape.
+
+    python ./tools/bench_push_timestamps.py gpu.json cpu.json
+"""
+import sys
+import json
+import time
+import argparse
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from dateutil.parser import parse
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'monster'))
+import process
+
+
+def synthetic_report(values: int = 600, timestamps: int = 5):
+    start = datetime(2025, 6, 15, 12, 0, 0, 123000, tzinfo=timezone(timedelta(hours=-5)))
+    metric_values = []
+    for i in range(values):
+        metric_values.append({
+            'MetricId': f'Metric{i % 20}',
+            'Timestamp': (start + timedelta(seconds=5 * (i % timestamps))).isoformat(timespec='milliseconds'),
+            'MetricValue': str(i % 100),
+            'Oem': {'Dell': {'Source': 'GPUStats', 'FQDD': f'Video.Slot.{i % 4}-1'}},
+        })
+    return {'Id': 'Synthetic', 'MetricValues': metric_values}
+
+
+def baseline(metric_values: list):
+    # The parsing used before: dateutil for every value
+    return [parse(m['Timestamp']).replace(microsecond=0) for m in metric_values if m.get('Timestamp')]
+
+
+def bench(func, rounds: int):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark push-mode timestamp parsing')
+    parser.add_argument('reports', nargs='*', help='Metric report JSON files')
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    reports = {}
+    for path in args.reports:
+        with open(path, 'r') as f:
+            reports[path] = json.load(f)
+    if not reports:
+        reports['synthetic'] = synthetic_report()
+
+    for name, report in reports.items():
+        report_id, values = process.extract_metric_values_push(report)
+        metric_values     = report.get('MetricValues', [])
+        distinct          = len({m.get('Timestamp') for m in metric_values})
+
+        # Both paths must produce the same timestamps
+        fast = process.single_process_idrac_push('bench', report_id, values, [])
+        fast_timestamps = sorted(r['timestamp'] for records in fast.values() for r in records)
+        slow_timestamps = sorted(parse(m['Timestamp']).replace(microsecond=0) for m in metric_values
+                                 if m.get('Timestamp') and m.get('MetricValue')
+                                 and m.get('Oem', {}).get('Dell', {}).get('Source')
+                                 and m.get('Oem', {}).get('Dell', {}).get('FQDD'))
+        assert fast_timestamps == slow_timestamps, f"Timestamps differ for {name}"
+
+        slow_time = bench(lambda: baseline(metric_values), args.rounds)
+        fast_time = bench(lambda: process.single_process_idrac_push('bench', report_id, values, []),
+                          args.rounds)
+        print(f"{name}: {len(metric_values)} values, {distinct} distinct timestamps")
+        print(f"    dateutil per value (timestamps only): {slow_time * 1000:8.2f} ms")
+        print(f"    single_process_idrac_push (whole parse): {fast_time * 1000:8.2f} ms")
+        print(f"    speed-up: {slow_time / fast_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+    Measure the memory per push-mode SSE connection.
+
+    Opens `--streams` SSE streams against a local server, either with a
+    ClientSession and TCPConnector per stream (as listen_idrac_push did
+    before) or with the single session of process.new_push_session, and
+    reports the Python heap and RSS growth per open stream. Pass a
+    certificate and key to serve the streams over TLS like an iDRAC, e.g.
+        openssl req -x509 -newkey rsa:2048 -nodes -keyout key.pem -out cert.pem -days 1 -subj /CN=127.0.0.1
+
+    python ./tools/bench_sse_memory.py --streams 500 --certfile cert.pem --keyfile key.pem
+"""
+import gc
+import logging
+import ssl
+import sys
+import asyncio
+import argparse
+import tracemalloc
+import multiprocessing
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'monster'))
+import process
+
+EVENT = b'data: {"Id":"Bench","MetricValues":[]}\n\n'
+
+
+def serve(port: int, certfile: str, keyfile: str):
+    async def stream(request):
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        try:
+            while True:
+                await response.write(EVENT)
+                await asyncio.sleep(5)
+        except ConnectionError:
+            # The client closed the stream
+            return response
+
+    # Streams dropped by the client are expected, keep the server quiet
+    for name in ('aiohttp', 'asyncio'):
+        logging.getLogger(name).setLevel(logging.CRITICAL)
+    ssl_context = None
+    if certfile:
+        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_context.load_cert_chain(certfile, keyfile)
+    app = web.Application()
+    app.router.add_get('/redfish/v1/SSE', stream)
+    web.run_app(app, host='127.0.0.1', port=port, ssl_context=ssl_context,
+                print=None, backlog=4096)
+
+
+def rss():
+    # Resident set size in bytes, Linux only
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * 4096
+    except OSError:
+        return 0
+
+
+async def open_stream(session: aiohttp.ClientSession, url: str, bufsize: int):
+    response = await session.get(url, headers={'Accept': 'text/event-stream'}, read_bufsize=bufsize)
+    await response.content.readuntil(b'\n\n')
+    return response
+
+
+async def measure(mode: str, url: str, streams: int, bufsize: int):
+    gc.collect()
+    tracemalloc.start()
+    base_heap = tracemalloc.get_traced_memory()[0]
+    base_rss  = rss()
+
+    sessions = []
+    responses = []
+    if mode == 'shared':
+        session = process.new_push_session('user', 'password', bufsize)
+        sessions.append(session)
+        for _ in range(streams):
+            responses.append(await open_stream(session, url, bufsize))
+    else:
+        for _ in range(streams):
+            session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=False, limit=None),
+                                            auth=aiohttp.BasicAuth('user', 'password'),
+                                            timeout=aiohttp.ClientTimeout(total=None),
+                                            read_bufsize=bufsize)
+            sessions.append(session)
+            responses.append(await open_stream(session, url, bufsize))
+
+    gc.collect()
+    heap = tracemalloc.get_traced_memory()[0] - base_heap
+    grown = rss() - base_rss
+    tracemalloc.stop()
+
+    for response in responses:
+        response.close()
+    for session in sessions:
+        await session.close()
+    return (heap / streams, grown / streams)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the memory per push-mode SSE connection')
+    parser.add_argument('--streams', type=int, default=200)
+    parser.add_argument('--read-bufsize', type=int, default=64, help='KiB')
+    parser.add_argument('--port', type=int, default=18443)
+    parser.add_argument('--certfile')
+    parser.add_argument('--keyfile')
+    args = parser.parse_args()
+
+    server = multiprocessing.Process(target=serve, args=(args.port, args.certfile, args.keyfile),
+                                     daemon=True)
+    server.start()
+    scheme = 'https' if args.certfile else 'http'
+    url = f"{scheme}://127.0.0.1:{args.port}/redfish/v1/SSE"
+
+    async def run():
+        # Wait for the server
+        for _ in range(100):
+            try:
+                _, writer = await asyncio.open_connection('127.0.0.1', args.port)
+                writer.close()
+                break
+            except OSError:
+                await asyncio.sleep(0.1)
+        results = {}
+        for mode in ('per-stream', 'shared'):
+            results[mode] = await measure(mode, url, args.streams, args.read_bufsize * 1024)
+        return results
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        server.terminate()
+
+    print(f"{args.streams} streams, {scheme}, read_bufsize {args.read_bufsize} KiB")
+    for mode, (heap, grown) in results.items():
+        print(f"    session {mode:10}: {heap / 1024:8.1f} KiB heap, {grown / 1024:8.1f} KiB RSS per stream")
+
+
+if __name__ == '__main__':
+    main()
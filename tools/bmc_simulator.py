@@ -0,0 +1,451 @@
+"""
+    Simulate a fleet of iDRACs on one machine for load and regression tests.
+
+    Every simulated iDRAC listens on its own loopback address (127.1.0.1,
+    127.1.0.2, ...) and serves the Redfish resources MonSter reads: the
+    service root, Systems and Managers (get_nodes_metadata), Chassis Thermal
+    and Power (pull model, with $select), TelemetryService and its
+    MetricDefinitions (init_tsdb), and MetricReport events on /redfish/v1/SSE
+    (push model). Latency, error rates, unreachable, hung and stalled nodes,
+    and dropped streams are configurable, so collectors can be benchmarked
+    and their failure handling exercised before a deployment. The nodes are
+    served by `--processes` processes; each prints its request and event
+    counts every `--stats-interval` seconds. The printed nodelist goes into
+    the idrac section of config.yml.
+
+    Without --certfile and --keyfile, a self-signed certificate is made with
+    openssl. Ports below 1024 need root.
+
+    python ./tools/bmc_simulator.py --nodes 2000 --processes 4 --latency 0.05 --error-rate 0.01
+"""
+import sys
+import ssl
+import base64
+import json
+import time
+import uuid
+import random
+import asyncio
+import logging
+import argparse
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+from datetime import datetime, timezone
+from pathlib import Path
+
+from aiohttp import web
+
+# Metrics of the MetricReports: (MetricId, MetricDataType, Units, Source,
+# FQDD pattern, sensors, low, high)
+METRICS = [
+    ('TemperatureReading', 'Decimal', 'Cel', 'TemperatureSensor', 'CPU.Socket.{}', 2, 30, 85),
+    ('RPMReading', 'Integer', 'RPM', 'FanSensor', 'Fan.Embedded.{}', 6, 3000, 15000),
+    ('PowerConsumption', 'Integer', 'W', 'PowerMetrics', 'PSU.Slot.{}', 2, 150, 1100),
+    ('CPUUsage', 'Decimal', '%', 'SystemUsage', 'CPU.Socket.{}', 2, 0, 100),
+    ('MemoryUsage', 'Decimal', '%', 'SystemUsage', 'DIMM.Socket.A{}', 8, 0, 100),
+]
+METRIC_INDEX = {metric[0]: metric for metric in METRICS}
+
+# MetricReports and the metrics in each; every report is one SSE event
+REPORTS = {
+    'ThermalSensor': ['TemperatureReading', 'RPMReading'],
+    'PowerMetrics': ['PowerConsumption'],
+    'SystemUsage': ['CPUUsage', 'MemoryUsage'],
+}
+
+
+def node_address(index: int):
+    # 250 nodes per /24, like the iDRAC subnets
+    return f"127.{1 + index // 62500}.{index // 250 % 250}.{index % 250 + 1}"
+
+
+def nodelist_ranges(nodes: int, port: int):
+    # Hostlist expressions of the nodes, one per /24
+    ranges = []
+    for start in range(0, nodes, 250):
+        end = min(nodes, start + 250) - 1
+        prefix = node_address(start).rsplit('.', 1)[0]
+        ranges.append(f"{prefix}.[{start % 250 + 1}-{end % 250 + 1}]:{port}")
+    return ranges
+
+
+class Node:
+    """
+    One simulated iDRAC. Its failure mode is drawn once from the fractions of
+    the arguments, with a seed per node, so a fleet is the same on every run.
+    """
+    def __init__(self, index: int, args: argparse.Namespace):
+        self.index   = index
+        self.address = node_address(index)
+        self.args    = args
+        self.rng     = random.Random(args.seed * 1000003 + index)
+
+        # Consecutive fractions of the fleet get each failure mode
+        draw = self.rng.random()
+        self.mode = 'ok'
+        for mode in ('dead', 'hang', 'slow', 'stall', 'bad_select'):
+            fraction = getattr(args, f"{mode}_fraction")
+            if draw < fraction:
+                self.mode = mode
+                break
+            draw -= fraction
+
+        self.uuid   = str(uuid.UUID(int=self.rng.getrandbits(128)))
+        self.serial = f"SIM{index:07d}"
+        self.sensors = [(metric_id, source, pattern.format(i + 1), low, high)
+                        for metric_id, _, _, source, pattern, count, low, high in METRICS
+                        for i in range(count)]
+
+    def delay(self):
+        # Response time: exponential around the mean, ten times longer for slow nodes
+        mean = self.args.latency * (10 if self.mode == 'slow' else 1)
+        return self.rng.expovariate(1 / mean) if mean > 0 else 0.0
+
+    def reading(self, low: float, high: float):
+        return round(self.rng.uniform(low, high), 2)
+
+    def system(self):
+        return {
+            '@odata.id': '/redfish/v1/Systems/System.Embedded.1',
+            'Id': 'System.Embedded.1',
+            'UUID': self.uuid,
+            'SerialNumber': self.serial,
+            'SKU': f"S{self.index:06d}",
+            'HostName': f"c{self.index + 1:03d}",
+            'Model': 'PowerEdge R760',
+            'Manufacturer': 'Dell Inc.',
+            'ProcessorSummary': {'Model': 'Intel(R) Xeon(R) Platinum 8480+', 'Count': 2,
+                                 'LogicalProcessorCount': 224},
+            'MemorySummary': {'TotalSystemMemoryGiB': 512},
+            'Status': {'Health': 'OK', 'State': 'Enabled'},
+        }
+
+    def manager(self):
+        return {
+            '@odata.id': '/redfish/v1/Managers/iDRAC.Embedded.1',
+            'Id': 'iDRAC.Embedded.1',
+            'Model': '16G Monolithic',
+            'FirmwareVersion': '7.10.30.00',
+            'Status': {'Health': 'OK', 'State': 'Enabled'},
+        }
+
+    def thermal(self):
+        fans = [{
+            '@odata.id': f'/redfish/v1/Chassis/System.Embedded.1/Thermal#/Fans/{i}',
+            '@odata.type': '#Thermal.v1_4_0.Fan',
+            'MemberId': f'0x17||Fan.Embedded.{i + 1}A',
+            'FanName': f'System Board Fan{i + 1}A',
+            'Name': f'System Board Fan{i + 1}A',
+            'Reading': int(self.reading(3000, 15000)),
+            'ReadingUnits': 'RPM',
+            'LowerThresholdCritical': 720,
+            'LowerThresholdFatal': 600,
+            'PhysicalContext': 'SystemBoard',
+            'Status': {'Health': 'OK', 'State': 'Enabled'},
+        } for i in range(self.args.fans)]
+        temperatures = [{
+            '@odata.id': f'/redfish/v1/Chassis/System.Embedded.1/Thermal#/Temperatures/{i}',
+            '@odata.type': '#Thermal.v1_4_0.Temperature',
+            'MemberId': f'iDRAC.Embedded.1#CPU{i + 1}Temp',
+            'Name': f'CPU{i + 1} Temp',
+            'ReadingCelsius': int(self.reading(30, 85)),
+            'UpperThresholdCritical': 100,
+            'UpperThresholdNonCritical': 95,
+            'PhysicalContext': 'CPU',
+            'Status': {'Health': 'OK', 'State': 'Enabled'},
+        } for i in range(self.args.temperatures)]
+        return {
+            '@odata.id': '/redfish/v1/Chassis/System.Embedded.1/Thermal',
+            '@odata.type': '#Thermal.v1_4_0.Thermal',
+            'Id': 'Thermal',
+            'Name': 'Thermal',
+            'Fans': fans,
+            'Temperatures': temperatures,
+            'Redundancy': [{'Name': 'System Board Fan Redundancy', 'Mode': 'N+m',
+                            'MaxNumSupported': 4, 'MinNumNeeded': 1,
+                            'RedundancySet': [{'@odata.id': fan['@odata.id']} for fan in fans],
+                            'Status': {'Health': 'OK', 'State': 'Enabled'}}],
+        }
+
+    def power(self):
+        return {
+            '@odata.id': '/redfish/v1/Chassis/System.Embedded.1/Power',
+            '@odata.type': '#Power.v1_5_0.Power',
+            'Id': 'Power',
+            'Name': 'Power',
+            'PowerControl': [{
+                '@odata.type': '#Power.v1_5_0.PowerControl',
+                'Name': 'System Power Control',
+                'PowerConsumedWatts': int(self.reading(150, 1100)),
+                'PowerCapacityWatts': 2400,
+                'PowerMetrics': {'AverageConsumedWatts': 600, 'IntervalInMin': 1,
+                                 'MaxConsumedWatts': 1100, 'MinConsumedWatts': 150},
+            }],
+            'PowerSupplies': [{'Name': f'PS{i + 1} Status', 'PowerCapacityWatts': 1400,
+                               'LineInputVoltage': 230, 'Status': {'Health': 'OK', 'State': 'Enabled'}}
+                              for i in range(2)],
+            'Voltages': [{'Name': f'PS{i + 1} Voltage 1', 'ReadingVolts': 230,
+                          'Status': {'Health': 'OK', 'State': 'Enabled'}} for i in range(2)],
+        }
+
+    def report(self, report_id: str, readings: int, interval: float):
+        # One MetricReport with `readings` values per sensor over the last interval
+        now = time.time()
+        stamps = [datetime.fromtimestamp(now - interval * i / readings, timezone.utc)
+                  .strftime('%Y-%m-%dT%H:%M:%S+00:00') for i in reversed(range(readings))]
+        values = []
+        for metric_id, source, fqdd, low, high in self.sensors:
+            if metric_id not in REPORTS[report_id]:
+                continue
+            for stamp in stamps:
+                values.append({'MetricId': metric_id, 'Timestamp': stamp,
+                               'MetricValue': str(self.reading(low, high)),
+                               'Oem': {'Dell': {'ContextID': fqdd, 'Label': f'{fqdd} {metric_id}',
+                                                'Source': source, 'FQDD': fqdd}}})
+        return {
+            '@odata.type': '#MetricReport.v1_4_2.MetricReport',
+            'Id': report_id,
+            'Name': f'{report_id} Metric Report',
+            'ReportSequence': str(int(now)),
+            'Timestamp': stamps[-1],
+            'MetricValues': values,
+            'MetricValues@odata.count': len(values),
+        }
+
+
+def select(resource: dict, query: str):
+    # Keep the selected top-level properties and the annotations
+    selected = set(query.split(','))
+    return {key: value for key, value in resource.items() if key in selected or key.startswith('@')}
+
+
+class Stats:
+    def __init__(self):
+        self.requests = 0
+        self.errors   = 0
+        self.events   = 0
+        self.streams  = 0
+        self.bytes    = 0
+
+
+def build_app(nodes: dict, args: argparse.Namespace, stats: Stats):
+    auth = None
+    if args.username:
+        token = base64.b64encode(f"{args.username}:{args.password}".encode()).decode()
+        auth = f"Basic {token}"
+
+    @web.middleware
+    async def faults(request, handler):
+        node = nodes[request.transport.get_extra_info('sockname')[0]]
+        request['node'] = node
+        stats.requests += 1
+        if auth and request.headers.get('Authorization') != auth:
+            return web.json_response({'error': 'unauthorized'}, status=401)
+        if node.mode == 'hang':
+            # Accepts the connection, never answers
+            await asyncio.sleep(3600 * 24)
+        await asyncio.sleep(node.delay())
+        if node.rng.random() < args.error_rate:
+            stats.errors += 1
+            return web.json_response({'error': 'service unavailable'}, status=503)
+        return await handler(request)
+
+    def respond(request, body: dict):
+        query = request.query.get('$select')
+        if query:
+            if request['node'].mode == 'bad_select':
+                stats.errors += 1
+                return web.json_response({'error': 'query not supported'}, status=400)
+            body = select(body, query)
+        data = json.dumps(body)
+        stats.bytes += len(data)
+        return web.Response(text=data, content_type='application/json')
+
+    async def root(request):
+        return respond(request, {'@odata.id': '/redfish/v1', 'RedfishVersion': '1.17.0',
+                                 'ProtocolFeaturesSupported': {'SelectQuery': True,
+                                                               'ExpandQuery': {'ExpandAll': False}}})
+
+    async def system(request):
+        return respond(request, request['node'].system())
+
+    async def manager(request):
+        return respond(request, request['node'].manager())
+
+    async def thermal(request):
+        return respond(request, request['node'].thermal())
+
+    async def power(request):
+        return respond(request, request['node'].power())
+
+    async def telemetry_service(request):
+        fqdds   = sorted({fqdd for _, _, fqdd, _, _ in request['node'].sensors})
+        sources = sorted({source for _, _, _, source, *_ in METRICS})
+        return respond(request, {'@odata.id': '/redfish/v1/TelemetryService', 'Id': 'TelemetryService',
+                                 'Oem': {'Dell': {'FQDDList': fqdds, 'SourceList': sources}}})
+
+    async def metric_definitions(request):
+        members = [{'@odata.id': f'/redfish/v1/TelemetryService/MetricDefinitions/{metric[0]}'}
+                   for metric in METRICS]
+        return respond(request, {'Members': members, 'Members@odata.count': len(members)})
+
+    async def metric_definition(request):
+        metric = METRIC_INDEX.get(request.match_info['id'])
+        if metric is None:
+            return web.json_response({'error': 'not found'}, status=404)
+        metric_id, data_type, units = metric[:3]
+        return respond(request, {'Id': metric_id, 'Name': f'{metric_id} Metric Definition',
+                                 'Description': f'Simulated {metric_id}', 'MetricType': 'Numeric',
+                                 'MetricDataType': data_type, 'Units': units, 'Accuracy': 1,
+                                 'SensingInterval': f'PT{args.report_interval:.0f}S',
+                                 'DiscreteValues': None})
+
+    async def sse(request):
+        node = request['node']
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        stats.streams += 1
+        lifetime = node.rng.expovariate(1 / args.stream_lifetime) if args.stream_lifetime else None
+        opened = time.monotonic()
+        sent = 0
+        try:
+            # Nodes do not report in lockstep
+            await asyncio.sleep(node.rng.uniform(0, args.report_interval))
+            while lifetime is None or time.monotonic() - opened < lifetime:
+                if node.mode != 'stall' or sent == 0:
+                    for report_id in REPORTS:
+                        report = node.report(report_id, args.readings, args.report_interval)
+                        data = f"data: {json.dumps(report)}\n\n".encode()
+                        await response.write(data)
+                        stats.events += 1
+                        stats.bytes  += len(data)
+                    sent += 1
+                await asyncio.sleep(args.report_interval)
+        except ConnectionError:
+            # The collector closed the stream
+            pass
+        finally:
+            stats.streams -= 1
+        return response
+
+    app = web.Application(middlewares=[faults])
+    app.router.add_get('/redfish/v1', root)
+    app.router.add_get('/redfish/v1/Systems/System.Embedded.1', system)
+    app.router.add_get('/redfish/v1/Managers/iDRAC.Embedded.1', manager)
+    app.router.add_get('/redfish/v1/Chassis/System.Embedded.1/Thermal', thermal)
+    app.router.add_get('/redfish/v1/Chassis/System.Embedded.1/Power', power)
+    app.router.add_get('/redfish/v1/TelemetryService', telemetry_service)
+    app.router.add_get('/redfish/v1/TelemetryService/MetricDefinitions', metric_definitions)
+    app.router.add_get('/redfish/v1/TelemetryService/MetricDefinitions/{id}', metric_definition)
+    app.router.add_get('/redfish/v1/SSE', sse)
+    return app
+
+
+async def run_nodes(worker: int, indexes: list, args: argparse.Namespace):
+    nodes = {node.address: node for node in (Node(index, args) for index in indexes)}
+    stats = Stats()
+    ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    ssl_context.load_cert_chain(args.certfile, args.keyfile)
+
+    runner = web.AppRunner(build_app(nodes, args, stats), access_log=None,
+                           handler_cancellation=True)
+    await runner.setup()
+    for node in nodes.values():
+        # Unreachable nodes do not listen at all
+        if node.mode != 'dead':
+            site = web.TCPSite(runner, node.address, args.port, ssl_context=ssl_context, backlog=1024)
+            await site.start()
+
+    modes = {}
+    for node in nodes.values():
+        modes[node.mode] = modes.get(node.mode, 0) + 1
+    print(f"[{worker}] {len(nodes)} nodes {modes}", flush=True)
+
+    started = time.monotonic()
+    try:
+        while not args.duration or time.monotonic() - started < args.duration:
+            await asyncio.sleep(args.stats_interval)
+            print(f"[{worker}] {stats.requests} requests, {stats.errors} errors, "
+                  f"{stats.streams} open streams, {stats.events} events, "
+                  f"{stats.bytes / 2 ** 20:.1f} MiB sent", flush=True)
+    finally:
+        await runner.cleanup()
+
+
+def serve(worker: int, indexes: list, args: argparse.Namespace):
+    # Thousands of listening sockets and connections per process
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    # Streams dropped by the collectors are expected, keep the server quiet
+    for name in ('aiohttp', 'asyncio'):
+        logging.getLogger(name).setLevel(logging.CRITICAL)
+    try:
+        asyncio.run(run_nodes(worker, indexes, args))
+    except KeyboardInterrupt:
+        pass
+
+
+def self_signed(directory: str):
+    certfile = str(Path(directory) / 'cert.pem')
+    keyfile  = str(Path(directory) / 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-keyout', keyfile,
+                    '-out', certfile, '-days', '30', '-subj', '/CN=bmc-simulator'],
+                   check=True, capture_output=True)
+    return (certfile, keyfile)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate a fleet of iDRACs on the loopback interface')
+    parser.add_argument('--nodes', type=int, default=100)
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--port', type=int, default=8443)
+    parser.add_argument('--certfile')
+    parser.add_argument('--keyfile')
+    parser.add_argument('--username', help='Require this user with basic auth')
+    parser.add_argument('--password', default='')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.05, help='Mean response time (s)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered 503')
+    parser.add_argument('--dead-fraction', type=float, default=0.0, help='Nodes that refuse connections')
+    parser.add_argument('--hang-fraction', type=float, default=0.0, help='Nodes that never answer')
+    parser.add_argument('--slow-fraction', type=float, default=0.0, help='Nodes ten times slower')
+    parser.add_argument('--stall-fraction', type=float, default=0.0,
+                        help='Nodes whose streams go silent after the first reports')
+    parser.add_argument('--bad-select-fraction', type=float, default=0.0,
+                        help='Nodes that advertise $select but reject it')
+    parser.add_argument('--report-interval', type=float, default=60, help='Seconds between reports')
+    parser.add_argument('--readings', type=int, default=1, help='Readings per sensor in a report')
+    parser.add_argument('--stream-lifetime', type=float, default=0,
+                        help='Mean seconds before a stream is dropped, 0 for never')
+    parser.add_argument('--fans', type=int, default=12)
+    parser.add_argument('--temperatures', type=int, default=4)
+    parser.add_argument('--stats-interval', type=float, default=10)
+    parser.add_argument('--duration', type=float, default=0, help='Seconds to run, 0 for ever')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        if not args.certfile:
+            args.certfile, args.keyfile = self_signed(directory)
+
+        print('nodelist:')
+        for nodes in nodelist_ranges(args.nodes, args.port):
+            print(f"  - {nodes}")
+        sys.stdout.flush()
+
+        indexes = list(range(args.nodes))
+        workers = [multiprocessing.Process(target=serve, args=(i, indexes[i::args.processes], args))
+                   for i in range(args.processes)]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+    Apply the storage settings that init_tsdb gives new tables to an existing
+    MonSter database: columnar compression of the metric hypertables of the
+    idrac, slurm, irc and pdu schemas, with the compression policy of the
+    configuration, the continuous aggregates of the numeric iDRAC and Slurm
+    metric tables, materialized over the existing data, and the indexes of the
+    MetricsBuilder query paths. Every step is idempotent and committed per
+    table, so the migration can be run again, e.g. after a change of the
+    configuration or an interrupted run.
+
+    python ./tools/migrate_tsdb.py --config=config.yml
+"""
+import sys
+from pathlib import Path
+
+import psycopg2
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'monster'))
+import sql
+from monster import utils
+
+
+def migrate_compression(conn: object, config: dict):
+    compress_after = utils.get_compression_config(config)['compress_after']
+    if not compress_after:
+        print("Compression is disabled (compress_after: 0), skipping")
+        return
+    for table_name in sql.get_hypertables(conn, utils.metric_schemas):
+        try:
+            added = sql.enable_compression(conn, table_name, compress_after)
+            conn.commit()
+            status = 'compression enabled' if added else 'compression already enabled'
+            print(f"{table_name}: {status}, policy after {compress_after} days")
+        except Exception as err:
+            conn.rollback()
+            print(f"{table_name}: cannot enable compression: {err}")
+
+
+def migrate_aggregates(conn: object, config: dict):
+    aggregate_config = utils.get_aggregate_config(config)
+    if not aggregate_config['buckets']:
+        print("Continuous aggregates are disabled (buckets: []), skipping")
+        return
+    hypertables = sql.get_hypertables(conn, ['idrac', 'slurm'])
+    value_types = sql.get_value_types(conn, ['idrac', 'slurm'])
+    for table_name in hypertables:
+        if value_types.get(table_name) not in utils.numeric_types:
+            continue
+        try:
+            sql.create_aggregates(conn, table_name, aggregate_config)
+            conn.commit()
+        except Exception as err:
+            conn.rollback()
+            print(f"{table_name}: cannot create aggregates: {err}")
+            continue
+        # Materialize the existing history, which the refresh policy does not
+        # reach past its refresh window
+        try:
+            sql.refresh_aggregates(conn, table_name, aggregate_config)
+            print(f"{table_name}: aggregates in {', '.join(aggregate_config['buckets'])} buckets")
+        except Exception as err:
+            print(f"{table_name}: aggregates created but not refreshed: {err}")
+
+
+def migrate_indexes(conn: object, config: dict):
+    # Building an index locks the table against writes until it is done
+    table_names = list(sql.get_hypertables(conn, utils.metric_schemas))
+    if sql.relation_exists(conn, 'slurm.jobs'):
+        table_names.append('slurm.jobs')
+    for table_name in table_names:
+        try:
+            sql.create_indexes(conn, table_name)
+            conn.commit()
+            names = [sql.get_index_name(table_name, columns) for columns in sql.get_index_columns(table_name)]
+            print(f"{table_name}: indexes {', '.join(names)}")
+        except Exception as err:
+            conn.rollback()
+            print(f"{table_name}: cannot create indexes: {err}")
+
+
+# Run in order
+MIGRATIONS = [migrate_compression, migrate_aggregates, migrate_indexes]
+
+
+def main():
+    config     = utils.parse_config()
+    connection = utils.init_tsdb_connection(config)
+    with psycopg2.connect(connection) as conn:
+        for migration in MIGRATIONS:
+            migration(conn, config)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+    Re-tune the chunk interval of the metric hypertables of an existing
+    MonSter database to the ingest rate measured on their latest closed,
+    uncompressed chunks, so a chunk holds about `timescaledb.chunks.target_size`
+    MiB. Only chunks created afterwards get the new interval. Tables without
+    such chunks, or whose interval is within 25% of the target, are left as
+    they are.
+
+    python ./tools/retune_chunks.py --config=config.yml
+"""
+import sys
+from pathlib import Path
+
+import psycopg2
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'monster'))
+import sql
+from monster import utils
+
+# Relative change below which an interval is kept
+TOLERANCE = 0.25
+
+
+def format_interval(seconds: float):
+    if seconds >= 86400:
+        return f"{seconds / 86400:.1f} days"
+    return f"{seconds / 3600:.1f} hours"
+
+
+def retune_chunks(conn: object, chunk_config: dict):
+    intervals = sql.get_chunk_intervals(conn, utils.metric_schemas)
+    for table_name in sql.get_hypertables(conn, utils.metric_schemas):
+        current = intervals.get(table_name)
+        rate = sql.get_ingest_rate(conn, table_name)
+        if current is None or rate is None:
+            print(f"{table_name}: no closed uncompressed chunks to measure, unchanged")
+            continue
+        target = sql.chunk_interval(rate, chunk_config)
+        status = f"{rate * 3600 / 1024 / 1024:.1f} MiB/hour, {format_interval(current)}"
+        if abs(target - current) <= TOLERANCE * current:
+            print(f"{table_name}: {status}, unchanged")
+            continue
+        try:
+            sql.set_chunk_interval(conn, table_name, target)
+            conn.commit()
+            print(f"{table_name}: {status} -> {format_interval(target)}")
+        except Exception as err:
+            conn.rollback()
+            print(f"{table_name}: cannot set the chunk interval: {err}")
+
+
+def main():
+    config       = utils.parse_config()
+    connection   = utils.init_tsdb_connection(config)
+    chunk_config = utils.get_chunk_config(config)
+    with psycopg2.connect(connection) as conn:
+        retune_chunks(conn, chunk_config)
+
+
+if __name__ == '__main__':
+    main()
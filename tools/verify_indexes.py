@@ -0,0 +1,91 @@
+"""
+    Report which of the query-path indexes created by init_tsdb (or
+    migrate_tsdb) the MetricsBuilder queries use. Each metric table and the
+    jobs table are queried as MetricsBuilder does, over the last day in
+    5-minute intervals, and the scans of the EXPLAIN plan of the query are
+    listed by the index they use. The planner picks sequential scans on
+    small tables, so run it on a database that holds a few days of data.
+    Exits with status 1 if a query uses none of the indexes of its table.
+
+    python ./tools/verify_indexes.py --config=config.yml
+"""
+import sys
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import psycopg2
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'monster'))
+import sql
+from mbuilder import mb_sql
+from monster import utils
+
+# Time range and interval of the queries
+HOURS    = 24
+INTERVAL = '5m'
+
+
+def get_queries(conn: object, start: str, end: str, interval: str):
+    # (table, MetricsBuilder query) of the metric tables and the jobs table
+    queries = []
+    for table_name in sql.get_hypertables(conn, ['idrac', 'slurm']):
+        schema_name, table = table_name.split('.', 1)
+        if table_name == 'slurm.node_jobs':
+            query = mb_sql.generate_slurm_node_jobs_sql(start, end, interval)
+        elif table_name == 'slurm.state':
+            query = mb_sql.generate_slurm_state_sql(start, end, interval)
+        elif schema_name == 'slurm':
+            query = mb_sql.generate_slurm_metric_sql(table, start, end, interval, 'max')
+        else:
+            query = mb_sql.generate_idrac_metric_sql(table, start, end, interval, 'max')
+        queries.append((table_name, query))
+    if sql.relation_exists(conn, 'slurm.jobs'):
+        queries.append(('slurm.jobs', mb_sql.generate_slurm_jobs_sql(start, end)))
+    return queries
+
+
+def get_scans(plan: dict, scans: Counter):
+    # Count the scans of the plan by index name, or by node type if none
+    if 'Relation Name' in plan:
+        scans[plan.get('Index Name', plan['Node Type'])] += 1
+    for child in plan.get('Plans', []):
+        get_scans(child, scans)
+    return scans
+
+
+def verify_indexes(conn: object, hours: float, interval: str):
+    now   = datetime.now(timezone.utc).replace(microsecond=0)
+    start = (now - timedelta(hours=hours)).isoformat()
+    end   = now.isoformat()
+    missing = []
+    with conn.cursor() as cur:
+        for table_name, query in get_queries(conn, start, end, interval):
+            cur.execute(f"EXPLAIN (FORMAT JSON) {query}")
+            scans = get_scans(cur.fetchone()[0][0]['Plan'], Counter())
+            # Chunk indexes are named after the index of the hypertable
+            expected = [sql.get_index_name(table_name, columns) for columns in sql.get_index_columns(table_name)]
+            used = {name: sum(count for scan, count in scans.items() if scan.endswith(name)) for name in expected}
+            if not any(used.values()):
+                missing.append(table_name)
+            others = {scan: count for scan, count in scans.items()
+                      if not any(scan.endswith(name) for name in expected)}
+            print(f"{table_name}: " + ', '.join(f"{name} {count}" for name, count in used.items())
+                  + (f"; other scans: {', '.join(f'{scan} {count}' for scan, count in others.items())}"
+                     if others else ''))
+    return missing
+
+
+def main():
+    config     = utils.parse_config()
+    connection = utils.init_tsdb_connection(config)
+    with psycopg2.connect(connection) as conn:
+        missing = verify_indexes(conn, HOURS, INTERVAL)
+    if missing:
+        print(f"No query-path index used by the queries of {', '.join(missing)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()